@@ -1,29 +1,88 @@
 import base64
+import hmac
 import json
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+import logging
+import orjson
+from flask import Flask, render_template, stream_template, request, redirect, url_for, session, jsonify, flash
+from flask.json.provider import DefaultJSONProvider
 import os
-import traceback
-from functools import wraps
+import time
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from sqlalchemy import exists, insert, select
+from sqlalchemy.orm import joinedload, load_only
 
 load_dotenv()
 
 from db import init_db, db
 from sample_data import ensure_sample_data
-from matcher import evaluate_rules_for_profile, evaluate_rule, evaluate_rule_with_details
+from matcher import evaluate_rules_for_profile, evaluate_rule_cached, get_scheme, profile_key, refresh_rules_cache
+
+from models import Scheme, SchemeRule, UserProfile
+
+class OrjsonProvider(DefaultJSONProvider):
+    # same key order and datetime format as Flask's provider, but encoded in C
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        # indent=, sort_keys= etc. only mean something to json.dumps
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify() path: hand orjson's bytes straight to the response, no str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
-from models import Scheme, SchemeRule, UserProfile, MatchResult
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv("FLASK_SECRET", "dev-secret-for-demo")
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# werkzeug stores the expanded method ("scrypt" -> "scrypt:32768:8:1"), so compare against that
+PASSWORD_HASH_PREFIX = generate_password_hash("", method=PASSWORD_HASH_METHOD).split("$", 1)[0]
+ADMIN_USER = os.getenv("ADMIN_USER", "admin").encode()
+ADMIN_PASS = os.getenv("ADMIN_PASS", "password").encode()
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "300"))
+_stats_cache = {"at": 0.0, "data": None}
+
+if os.getenv("FLASK_DEV") == "1":
+    # dev only: log any lazy load that would turn into an N+1
+    try:
+        from nplusone.ext.flask_sqlalchemy import NPlusOne
+        app.config['NPLUSONE_LOGGER'] = logging.getLogger('nplusone')
+        app.config['NPLUSONE_LOG_LEVEL'] = logging.WARN
+        NPlusOne(app)
+    except ImportError:
+        app.logger.info("nplusone not installed; N+1 detection disabled")
 
 init_db(app)
 with app.app_context():
+    # SEED_ON_STARTUP=0 leaves seeding to `flask --app app seed`
+    if os.getenv("SEED_ON_STARTUP", "1") == "1":
+        ensure_sample_data()
+    refresh_rules_cache()
+
+
+@app.cli.command("seed")
+def seed_command():
     ensure_sample_data()
+    refresh_rules_cache()
 
-idian_states = [
+idian_states = (
     "Andhra Pradesh","Arunachal Pradesh","Assam","Bihar","Chhattisgarh","Goa",
     "Gujarat","Haryana","Himachal Pradesh","Jharkhand","Karnataka","Kerala",
     "Madhya Pradesh","Maharashtra","Manipur","Meghalaya","Mizoram","Nagaland",
@@ -31,31 +90,63 @@ idian_states = [
     "Uttar Pradesh","Uttarakhand","West Bengal",
     "Andaman and Nicobar Islands","Chandigarh","Dadra and Nagar Haveli and Daman and Diu",
     "Delhi","Jammu and Kashmir","Ladakh","Lakshadweep","Puducherry"
-]
+)
 
-caste_cat = [
+caste_cat = (
     "General/Unreserved",
     "Other Backward Classes (OBC)",
     "Scheduled Caste (SC)",
     "Scheduled Tribe (ST)",
     "Economically Weaker Section (EWS)",
     "Other / Prefer not to say"
-]
+)
+
+# immutable, so one context dict can be shared by every profile form render
+_form_ctx = {'states': idian_states, 'castes': caste_cat}
+
+def _get_scheme_with_rules(scheme_id):
+    # one round-trip: the scheme row joined to its rules, limited to the columns the views read
+    return (
+        Scheme.query
+        .options(load_only(Scheme.id, Scheme.title, Scheme.description, Scheme.source_url),
+                 joinedload(Scheme.rules))
+        .filter_by(id=scheme_id)
+        .one_or_none()
+    )
+
+def check_admin_credentials(username, password):
+    # constant-time compares, and & so the password is checked even when the username is wrong
+    user_ok = hmac.compare_digest((username or "").encode(), ADMIN_USER)
+    pass_ok = hmac.compare_digest((password or "").encode(), ADMIN_PASS)
+    return user_ok & pass_ok
+
+def _pretty_json(obj):
+    # stdlib json falls back to its pure-Python encoder whenever indent is set
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    except TypeError:
+        return json.dumps(obj, indent=2)
+
+def _decode_profile(encoded_data):
+    try:
+        return json.loads(base64.urlsafe_b64decode(encoded_data).decode())
+    except Exception:
+        return {}
 
 def _to_int_or_none(v):
+    if not v:
+        return None
     try:
-        if v is None or v == '': 
-            return None
         return int(v)
-    except ValueError: 
+    except (TypeError, ValueError):
         return None
 
 def _to_float_or_none(v):
+    if not v:
+        return None
     try:
-        if v is None or v == '': 
-            return None
         return float(v)
-    except ValueError: 
+    except (TypeError, ValueError):
         return None
 
 def extract_profile_from_form(req_form):
@@ -74,20 +165,15 @@ def extract_profile_from_form(req_form):
 @app.route('/')
 def index():
     if request.args.get('mode') == 'manual':
-        return render_template('index.html', 
-                               states=idian_states, 
-                               castes=caste_cat,
-                               manual_mode=True)
+        return render_template('index.html', manual_mode=True)
 
     user_id = session.get('user_id')
     
     if user_id:
-        user = UserProfile.query.get(user_id)
+        user = db.session.get(UserProfile, user_id)
         
         if user and user.profile:
-            session['profile'] = user.profile 
-
-            results = evaluate_rules_for_profile(user.profile)
+            results = evaluate_rules_for_profile(user.profile, details=False)
             return render_template('results.html', 
                                    results=results, 
                                    profile=user.profile, 
@@ -96,7 +182,7 @@ def index():
             flash("Welcome! Please complete your profile to see eligible schemes.")
             return redirect(url_for('profile'))
 
-    return render_template('index.html', states=idian_states, castes=caste_cat)
+    return render_template('index.html')
 
 
 @app.route('/results')
@@ -106,25 +192,22 @@ def results():
     
     encoded_data = request.args.get('data')
     if encoded_data:
-        try:
-            json_str = base64.urlsafe_b64decode(encoded_data).decode()
-            profile = json.loads(json_str)
-        except Exception as e:
-            profile = {}
+        profile = _decode_profile(encoded_data)
 
     elif session.get('user_id'):
-        user = UserProfile.query.get(session['user_id'])
+        user = db.session.get(UserProfile, session['user_id'])
         if user and user.profile:
             profile = user.profile
             is_dashboard = True
     if profile:
-        results = evaluate_rules_for_profile(profile)
+        results = evaluate_rules_for_profile(profile, details=False)
     else:
         results = []
 
     return render_template('results.html', 
                            results=results, 
                            profile=profile, 
+                           profile_data=encoded_data if profile else None,
                            is_dashboard=is_dashboard)
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -133,7 +216,7 @@ def profile():
         flash('Please login to edit your profile')
         return redirect(url_for('login'))
     
-    user = UserProfile.query.get(session['user_id'])
+    user = db.session.get(UserProfile, session['user_id'])
     
     if user is None:
         session.pop('user_id', None)
@@ -149,8 +232,7 @@ def profile():
         
     return render_template('profile.html', 
                            user=user, 
-                           states=idian_states, 
-                           castes=caste_cat)
+                           **_form_ctx)
 
 
 @app.route('/signup', methods=['GET','POST'])
@@ -170,7 +252,7 @@ def signup():
             flash('An account with that email already exists')
             return redirect(url_for('signup'))
 
-        pw_hash = generate_password_hash(password)
+        pw_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         user = UserProfile(email=email, password_hash=pw_hash, name=name, phone=phone, profile={})
         db.session.add(user)
         db.session.commit()
@@ -201,6 +283,11 @@ def login():
         if not check_password_hash(user.password_hash, password):
             flash('Invalid credentials')
             return redirect(url_for('login'))
+
+        # upgrade older (e.g. pbkdf2) hashes while we have the plaintext
+        if user.password_hash.split('$', 1)[0] != PASSWORD_HASH_PREFIX:
+            user.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+            db.session.commit()
         
         session['user_id'] = user.id
         flash('Logged in')
@@ -221,7 +308,7 @@ def match():
     is_manual_check = request.form.get('is_manual_check') == '1'
 
     if session.get('user_id') and not is_manual_check:
-        user = UserProfile.query.get(session['user_id'])
+        user = db.session.get(UserProfile, session['user_id'])
         if user:
             user.profile = profile
             db.session.commit()
@@ -234,11 +321,11 @@ def match():
 
 @app.route('/scheme/<int:scheme_id>')
 def scheme_detail(scheme_id):
-    s = Scheme.query.get(scheme_id)
+    s = get_scheme(scheme_id)
     if not s:
         return 'Scheme not found', 404
 
-    rules = SchemeRule.query.filter_by(scheme_id=scheme_id).all()
+    rules = s.rules
 
     scheme_data = {
         'id': s.id,
@@ -256,15 +343,25 @@ def scheme_detail(scheme_id):
         rule_json = r0.rule_json
         confidence = getattr(r0, 'parser_confidence', None)
 
-    profile = session.get('profile')
+    # guests carry their profile in the same ?data= value /results was opened with
+    profile = None
+    encoded_data = request.args.get('data')
+    if encoded_data:
+        profile = _decode_profile(encoded_data)
+    elif session.get('user_id'):
+        user = db.session.get(UserProfile, session['user_id'])
+        profile = user.profile if user else None
 
     evaluation = None
     evaluation_details = []
+    skipped_total = 0
     try:
         if profile and rules:
+            best = None
+            key_of_profile = profile_key(profile)
             for r in rules:
                 rule_obj = r.rule_json
-                passed, score, details = evaluate_rule_with_details(rule_obj, profile)
+                passed, score, details = evaluate_rule_cached(r.id, rule_obj, profile, key_of_profile)
                 score_pct = round(float(score) * 100.0, 2)
                 
                 failed_any = any(d.get('status') is False for d in details)
@@ -279,16 +376,19 @@ def scheme_detail(scheme_id):
                 else:
                     label = 'Maybe Eligible'
 
-                evaluation_details.append({
+                det = {
                     'rule_id': getattr(r, 'id', None),
                     'score': score_pct,
                     'label': label,
                     'parser_confidence': getattr(r, 'parser_confidence', None),
                     'evaluations': details,
                     'snippet': getattr(r, 'snippet', None)
-                })
-            
-            best = max(evaluation_details, key=lambda x: x['score'])
+                }
+                evaluation_details.append(det)
+                skipped_total += sum(1 for d in details if d.get('skipped'))
+                if best is None or score_pct > best['score']:
+                    best = det
+
             evaluation = {
                 'label': best['label'],
                 'score': best['score'],
@@ -301,19 +401,10 @@ def scheme_detail(scheme_id):
     except Exception as e:
         evaluation = {'error': str(e)}
 
-    skipped_total = 0
-    try:
-        for det in evaluation_details:
-            for ev in det.get('evaluations', []):
-                if ev.get('skipped'):
-                    skipped_total += 1
-    except Exception:
-        skipped_total = 0
-
     pretty_rule = None
     if rule_json:
         try:
-            pretty_rule = json.dumps(rule_json, indent=2)
+            pretty_rule = _pretty_json(rule_json)
         except:
             pretty_rule = str(rule_json)
 
@@ -333,7 +424,7 @@ def admin_login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        if username == os.getenv("ADMIN_USER", "admin") and password == os.getenv("ADMIN_PASS", "password"):
+        if check_admin_credentials(username, password):
             session['admin'] = True
             return redirect(url_for('admin_dashboard'))
         else:
@@ -350,23 +441,31 @@ def admin_dashboard():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
 
-    rows = db.session.query(Scheme, SchemeRule).outerjoin(SchemeRule, Scheme.id==SchemeRule.scheme_id).all()
-    schemes = []
-    for scheme, rule in rows:
-        schemes.append({
-            'id': scheme.id,
-            'title': scheme.title,
-            'confidence': rule.parser_confidence if rule else None,
-            'has_rule': bool(rule)
-        })
-    return render_template('admin_dashboard.html', schemes=schemes)
+    # one row per scheme: the first rule's confidence and whether any rule exists, computed in SQL
+    first_confidence = (select(SchemeRule.parser_confidence)
+                        .where(SchemeRule.scheme_id == Scheme.id)
+                        .order_by(SchemeRule.id)
+                        .limit(1)
+                        .scalar_subquery())
+    has_rule = exists().where(SchemeRule.scheme_id == Scheme.id)
+    rows = db.session.execute(
+        select(Scheme.id, Scheme.title, first_confidence.label('confidence'), has_rule.label('has_rule'))
+        .order_by(Scheme.id)
+        .execution_options(yield_per=200)
+    )
+    schemes = (
+        {'id': r.id, 'title': r.title, 'confidence': r.confidence, 'has_rule': bool(r.has_rule)}
+        for r in rows
+    )
+    # rows are rendered and sent as they arrive from the cursor
+    return stream_template('admin_dashboard.html', schemes=schemes)
 
 @app.route('/admin/verify/<int:scheme_id>', methods=['GET','POST'])
 def admin_verify(scheme_id):
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
 
-    s = Scheme.query.get(scheme_id)
+    s = _get_scheme_with_rules(scheme_id)
     if not s:
         return 'Scheme not found', 404
 
@@ -379,40 +478,78 @@ def admin_verify(scheme_id):
             flash('Invalid JSON: ' + str(e))
             return redirect(url_for('admin_verify', scheme_id=scheme_id))
 
-        existing = SchemeRule.query.filter_by(scheme_id=scheme_id).first()
-        if existing:
-            existing.rule_json = parsed
-            existing.snippet = snippet
-            existing.parser_confidence = 1.0
-            existing.verified = True
+        new_rows = []
+        if isinstance(parsed, dict):
+            existing = s.rules[0] if s.rules else None
+            if existing:
+                existing.rule_json = parsed
+                existing.snippet = snippet
+                existing.parser_confidence = 1.0
+                existing.verified = True
+            else:
+                new_rows.append({'scheme_id': scheme_id, 'rule_json': parsed, 'snippet': snippet,
+                                 'parser_confidence': 1.0, 'verified': True})
         else:
-            newr = SchemeRule(scheme_id=scheme_id, rule_json=parsed, snippet=snippet, parser_confidence=1.0, verified=True)
-            db.session.add(newr)
+            # a JSON array saves several rules at once: an entry with an "id" updates that rule
+            # of this scheme, the rest go in as one executemany INSERT. An entry's own "snippet"
+            # replaces the stored one; otherwise existing rules keep theirs
+            by_id = {r.id: r for r in s.rules}
+            ids = [e['id'] for e in parsed if isinstance(e, dict) and 'id' in e] if isinstance(parsed, list) else []
+            if (not isinstance(parsed, list) or not parsed or not all(isinstance(e, dict) for e in parsed)
+                    or not all(isinstance(i, int) and i in by_id for i in ids) or len(set(ids)) != len(ids)):
+                flash('Invalid JSON: expected a rule object or a non-empty list of rule objects, '
+                      'each "id" naming a different rule of this scheme')
+                return redirect(url_for('admin_verify', scheme_id=scheme_id))
+
+            for entry in parsed:
+                rule = {k: v for k, v in entry.items() if k not in ('id', 'snippet')}
+                if 'id' in entry:
+                    existing = by_id[entry['id']]
+                    existing.rule_json = rule
+                    if 'snippet' in entry:
+                        existing.snippet = entry['snippet']
+                    existing.parser_confidence = 1.0
+                    existing.verified = True
+                else:
+                    new_rows.append({'scheme_id': scheme_id, 'rule_json': rule,
+                                     'snippet': entry.get('snippet', snippet),
+                                     'parser_confidence': 1.0, 'verified': True})
+        if new_rows:
+            db.session.execute(insert(SchemeRule), new_rows)
         db.session.commit()
+        refresh_rules_cache()
         flash('Saved')
         return redirect(url_for('admin_dashboard'))
     else:
-        r = SchemeRule.query.filter_by(scheme_id=scheme_id).first()
-        rule_json = json.dumps(r.rule_json, indent=2) if r and r.rule_json else json.dumps({'all': []}, indent=2)
+        r = s.rules[0] if s.rules else None
+        rule_json = _pretty_json(r.rule_json if r and r.rule_json else {'all': []})
         snippet = r.snippet if r else 'No snippet available (dummy data)'
         return render_template('admin_verify.html', scheme={'id': s.id, 'title': s.title}, rule_json=rule_json, snippet=snippet)
 
 @app.route('/api/stats/schemes_by_state')
 def stats_schemes_by_state():
+    cached = _stats_cache["data"]
+    if cached is not None and time.monotonic() - _stats_cache["at"] < STATS_CACHE_TTL:
+        return app.response_class(cached, mimetype=app.json.mimetype)
     try:
         from sqlalchemy import func
         rows = db.session.query(Scheme.state, func.count(Scheme.id)).group_by(Scheme.state).all()
-        return jsonify([{ 'state': r[0] or 'Unknown', 'count': r[1]} for r in rows])
+        data = [{ 'state': r[0] or 'Unknown', 'count': r[1]} for r in rows]
+        # keep the encoded body so cache hits skip serialization too
+        body = jsonify(data).get_data()
+        _stats_cache["data"] = body
+        _stats_cache["at"] = time.monotonic()
+        return app.response_class(body, mimetype=app.json.mimetype)
     except Exception as e:
         app.logger.exception("Error computing stats")
         return jsonify({"error": "Failed to compute stats", "detail": str(e)}), 500
 
 @app.route('/api/scheme/<int:scheme_id>')
 def api_scheme(scheme_id):
-    s = Scheme.query.get(scheme_id)
+    s = get_scheme(scheme_id)
     if not s:
         return jsonify({'error':'not found'}), 404
-    r = SchemeRule.query.filter_by(scheme_id=scheme_id).first()
+    r = s.rules[0] if s.rules else None
     return jsonify({
         'id': s.id,
         'title': s.title,
@@ -424,4 +561,5 @@ def api_scheme(scheme_id):
     })
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # local development only; deploy with gunicorn (see wsgi.py)
+    app.run(debug=os.getenv("FLASK_DEV") == "1")
\ No newline at end of file
@@ -1,15 +1,47 @@
 import os
+import json
+import orjson
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
 from dotenv import load_dotenv
 
 load_dotenv()
 db = SQLAlchemy()
 
+def _json_serializer(value):
+    # orjson for JSON columns; stdlib json for what it rejects (e.g. ints beyond 64 bits)
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return json.dumps(value)
+
 def init_db(app):
     db_url = os.getenv("DATABASE_URL")
-    print(db_url)
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # behind PgBouncer the real backend pool lives in the bouncer, so keep ours small
+    pgbouncer = os.getenv("DB_PGBOUNCER") == "1"
+    engine_options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5" if pgbouncer else "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10" if pgbouncer else "20")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        # fail fast instead of queueing for 30s when the pool is exhausted
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "5")),
+        "pool_pre_ping": True,
+        "json_serializer": _json_serializer,
+        "json_deserializer": orjson.loads,
+    }
+    if db_url and make_url(db_url).get_driver_name() == "psycopg2":
+        # page executemany UPDATE/DELETE through execute_batch as well as INSERTs
+        engine_options["executemany_mode"] = "values_plus_batch"
+        engine_options["executemany_batch_page_size"] = 500
+    if pgbouncer and db_url and make_url(db_url).get_driver_name() == "psycopg":
+        # transaction pooling can hand the next statement to another backend,
+        # where psycopg 3's auto-prepared statements don't exist
+        engine_options["connect_args"] = {"prepare_threshold": None}
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     db.init_app(app)
-    with app.app_context():
-        db.create_all()
+    # set AUTO_CREATE_TABLES=0 on workers once the schema exists to skip the table checks at boot
+    if os.getenv("AUTO_CREATE_TABLES", "1") == "1":
+        with app.app_context():
+            db.create_all()
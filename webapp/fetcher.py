@@ -1,19 +1,31 @@
+import asyncio
 import csv
 import hashlib
 import os
-import time
+import re
 from pathlib import Path
 from urllib.parse import urlparse
 
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 script_folder = Path(__file__).resolve().parent
 seed_csv = script_folder / "seedurls.csv"
 OUT_DIR = script_folder / "output" / "raw_html"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 NAV_TIMEOUT_MS = 45_000
-WAIT_AFTER_NETWORK_IDLE_S = 1.0
+CONTENT_SELECTOR = "main, article, .content"
+CONTENT_WAIT_MS = 3_000
 MAX_RETRIES = 2
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+# re-download pages that already have a saved copy
+FETCH_FORCE = os.getenv("FETCH_FORCE") == "1"
+# the parser only reads the DOM, so these are never worth downloading
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
 BROWSER_VIEWPORT = {"width": 1280, "height": 900}
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -21,17 +33,21 @@ USER_AGENT = (
 )
 
 
-def url_to_filename(url: str) -> str:
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.-]")
+
+
+def url_to_filename(url: str, legacy: bool = False) -> str:
     parsed = urlparse(url)
     domain = parsed.netloc.replace(":", "_")
     path_part = parsed.path.strip("/").replace("/", "_") or "index"
     base = f"{domain}__{path_part}"
-    h = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    if legacy:
+        # naming used before the switch to blake2b, only needed to migrate saved pages
+        h = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+    else:
+        h = hashlib.blake2b(url.encode("utf-8"), digest_size=4).hexdigest()
 
-    url_key = "".join(
-        c if c.isalnum() or c in ("-", "_", ".") else "_"
-        for c in f"{base}__{h}"
-    )
+    url_key = UNSAFE_FILENAME_CHARS.sub("_", f"{base}__{h}")
     return url_key
 
 
@@ -40,21 +56,23 @@ def read_seed_urls(csv_path: Path):
         print(f"seedurls.csv not found at: {csv_path}")
         return []
 
+    # optional needs_js column: only rows marked 0/false/no skip the browser
     urls = []
     with open(csv_path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
+            needs_js = (row.get("needs_js") or "").strip().lower() not in ("0", "false", "no")
             if "url" in row and row["url"].strip():
-                urls.append(row["url"].strip())
+                urls.append((row["url"].strip(), needs_js))
             else:
                 first = next(iter(row.values()), "").strip()
                 if first:
-                    urls.append(first)
+                    urls.append((first, True))
     return urls
 
 
-def scroll_page_slowly(page):
-    page.evaluate(
+async def scroll_page_slowly(page):
+    await page.evaluate(
         """() => {
             return new Promise(resolve => {
               const total = document.body.scrollHeight;
@@ -65,30 +83,38 @@ def scroll_page_slowly(page):
                 window.scrollTo(0, pos);
                 if (pos >= total) {
                   clearInterval(t);
-                  setTimeout(resolve, 300);
+                  setTimeout(resolve, 100);
                 }
-              }, 150);
+              }, 50);
             });
         }"""
     )
 
 
-def fetch_single_page(page, url: str, out_path: Path) -> bool:
+async def block_unneeded(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def fetch_single_page(page, url: str, out_path: Path) -> bool:
     try:
-        page.set_viewport_size(BROWSER_VIEWPORT)
-        page.set_extra_http_headers({"User-Agent": USER_AGENT})
-        page.goto(url, wait_until="networkidle", timeout=NAV_TIMEOUT_MS)
+        await page.goto(url, wait_until="domcontentloaded")
 
-        time.sleep(WAIT_AFTER_NETWORK_IDLE_S)
+        # wait for the main content block rather than for the network to go quiet
+        try:
+            await page.wait_for_selector(CONTENT_SELECTOR, timeout=CONTENT_WAIT_MS)
+        except PlaywrightTimeoutError:
+            pass
         try:
-            scroll_page_slowly(page)
+            await scroll_page_slowly(page)
         except Exception:
             pass
 
-        time.sleep(0.2)
-
-        html = page.content()
-        out_path.write_text(html, encoding="utf-8")
+        html = await page.content()
+        # keep the event loop free for the other pages while writing
+        await asyncio.to_thread(out_path.write_text, html, encoding="utf-8")
         return True
 
     except PlaywrightTimeoutError as te:
@@ -100,54 +126,126 @@ def fetch_single_page(page, url: str, out_path: Path) -> bool:
         return False
 
 
-def main():
-    urls = read_seed_urls(seed_csv)
-    if not urls:
-        print("No URLs found in seedurls.csv")
-        return
+async def fetch_static(client, url: str, out_file: Path, idx: int, total: int) -> bool:
+    print(f"[{idx}/{total}] Fetching (static): {url}")
 
-    print(f"[INFO] Starting fetch of {len(urls)} URLs...")
+    for attempt in range(1, MAX_RETRIES + 2):
+        try:
+            r = await client.get(url)
+            r.raise_for_status()
+            await asyncio.to_thread(out_file.write_text, r.text, encoding="utf-8")
+            print(f"  -> saved: {out_file}")
+            return True
+        except Exception as e:
+            print(f"  -> attempt {attempt} failed: {url} -> {e}")
+            if attempt <= MAX_RETRIES:
+                await asyncio.sleep(1.5 ** attempt)
+    return False
+
+
+async def fetch_static_urls(jobs, total):
+    # plain HTTP/2 client with one shared connection pool, no browser needed
+    async with httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        timeout=NAV_TIMEOUT_MS / 1000,
+        limits=httpx.Limits(max_connections=FETCH_CONCURRENCY * 2),
+    ) as client:
+        return await asyncio.gather(*(
+            fetch_static(client, url, out_file, idx, total) for idx, url, out_file in jobs
+        ))
+
+
+async def fetch_one(pages: asyncio.Queue, url: str, out_file: Path, idx: int, total: int) -> bool:
+    # borrow a page from the pool; it goes back for the next URL when we're done
+    page = await pages.get()
+    try:
+        print(f"[{idx}/{total}] Fetching: {url}")
+
+        success = False
+        attempt = 0
+        while attempt <= MAX_RETRIES and not success:
+            attempt += 1
+            success = await fetch_single_page(page, url, out_file)
+            if success:
+                print(f"  -> saved: {out_file}")
+            else:
+                print(f"  -> attempt {attempt} failed: {url}")
+                # Exponential backoff before retry
+                await asyncio.sleep(1.5 ** attempt)
+
+        if not success:
+            print(f"  -> FAILED after {MAX_RETRIES + 1} attempts: {url}")
+        return success
+    finally:
+        pages.put_nowait(page)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
+
+async def fetch_browser_urls(jobs, total):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(
             java_script_enabled=True,
-            user_agent=USER_AGENT
+            bypass_csp=True,
+            user_agent=USER_AGENT,
+            viewport=BROWSER_VIEWPORT
         )
+        await context.route("**/*", block_unneeded)
 
         try:
-            for idx, url in enumerate(urls, start=1):
-                print(f"[{idx}/{len(urls)}] Fetching: {url}")
-                url_key = url_to_filename(url)
-                out_file = OUT_DIR / f"{url_key}.html"
-
-                success = False
-                attempt = 0
-                while attempt <= MAX_RETRIES and not success:
-                    attempt += 1
-                    page = context.new_page()
-
-                    try:
-                        success = fetch_single_page(page, url, out_file)
-                        if success:
-                            print(f"  -> saved: {out_file}")
-                        else:
-                            print(f"  -> attempt {attempt} failed")
-                            # Exponential backoff before retry
-                            time.sleep(1.5 ** attempt)
-
-                    finally:
-                        try:
-                            page.close()
-                        except Exception:
-                            pass
-
-                if not success:
-                    print(f"  -> FAILED after {MAX_RETRIES + 1} attempts: {url}")
+            # one reusable page per worker, so at most FETCH_CONCURRENCY loads at a time
+            pages = asyncio.Queue()
+            for _ in range(min(FETCH_CONCURRENCY, len(jobs))):
+                page = await context.new_page()
+                page.set_default_navigation_timeout(NAV_TIMEOUT_MS)
+                pages.put_nowait(page)
+
+            await asyncio.gather(*(
+                fetch_one(pages, url, out_file, idx, total)
+                for idx, url, out_file in jobs
+            ))
 
         finally:
-            context.close()
-            browser.close()
+            await context.close()
+            await browser.close()
+
+
+async def fetch_all_urls(seeds):
+    total = len(seeds)
+    static_jobs, browser_jobs = [], []
+    for idx, (url, needs_js) in enumerate(seeds, start=1):
+        out_file = OUT_DIR / f"{url_to_filename(url)}.html"
+        if not out_file.exists():
+            old_file = OUT_DIR / f"{url_to_filename(url, legacy=True)}.html"
+            if old_file.exists():
+                old_file.replace(out_file)
+        if out_file.exists() and not FETCH_FORCE:
+            print(f"[{idx}/{total}] Already saved, skipping: {url}")
+            continue
+        if needs_js or httpx is None:
+            browser_jobs.append((idx, url, out_file))
+        else:
+            static_jobs.append((idx, url, out_file))
+
+    if static_jobs:
+        results = await fetch_static_urls(static_jobs, total)
+        # anything the plain client couldn't fetch gets another go in the browser
+        browser_jobs += [job for job, ok in zip(static_jobs, results) if not ok]
+
+    if browser_jobs:
+        await fetch_browser_urls(browser_jobs, total)
+
+
+def main():
+    urls = read_seed_urls(seed_csv)
+    if not urls:
+        print("No URLs found in seedurls.csv")
+        return
+
+    print(f"[INFO] Starting fetch of {len(urls)} URLs...")
+
+    asyncio.run(fetch_all_urls(urls))
 
     print("Fetching complete!")
 
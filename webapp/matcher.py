@@ -1,7 +1,52 @@
+import hashlib
 import json
+import operator
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import and_, or_, select
 from db import db
 from models import Scheme, SchemeRule
 
+RULES_CACHE_TTL = float(os.getenv("RULES_CACHE_TTL", "60"))
+RULES_LOAD_BATCH = int(os.getenv("RULES_LOAD_BATCH", "500"))
+# optional pruning of low-confidence parser output; admin-verified rules always stay
+RULES_MIN_CONFIDENCE = os.getenv("RULES_MIN_CONFIDENCE")
+RULES_MAX_PER_SCHEME = int(os.getenv("RULES_MAX_PER_SCHEME", "0"))
+# "gen" goes up on every rebuild, for caches that shouldn't force one just to compare snapshots
+_rules_cache = {"at": 0.0, "schemes": None, "gen": 0}
+_compiled_memo = {}
+
+DETAILS_CACHE_SIZE = int(os.getenv("DETAILS_CACHE_SIZE", "4096"))
+_details_cache = OrderedDict()
+_details_lock = threading.Lock()
+
+RESULTS_CACHE_SIZE = int(os.getenv("RESULTS_CACHE_SIZE", "1024"))
+_results_cache = OrderedDict()
+
+SCHEME_CACHE_SIZE = int(os.getenv("SCHEME_CACHE_SIZE", "4096"))
+_scheme_cache = OrderedDict()
+
+_NUMERIC_OPS = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le}
+
+# one profile field, cast and lowercased once per request instead of once per rule
+ProfileField = namedtuple("ProfileField", "raw num lower lowers")
+
+# read-only stand-ins for the Scheme/SchemeRule rows the detail views use
+SchemeView = namedtuple("SchemeView", "id title description source_url rules")
+RuleView = namedtuple("RuleView", "id rule_json snippet parser_confidence")
+
+def _outcome(rule_str, status, profile_value, explanation):
+    return {
+        "rule": rule_str,
+        "status": status,
+        "profile_value": profile_value,
+        "explanation": explanation,
+        "skipped": False
+    }
+
 class MatchingEngine:
     def _safe_cast_number(self, v):
         if v is None: 
@@ -9,146 +54,219 @@ class MatchingEngine:
         if isinstance(v, (int, float)): 
             return v
         s = str(v).replace(',', '').strip()
-        try:
-            if '.' in s: 
-                return float(s)
+        # plain integers (the common case) are recognised without raising
+        digits = s[1:] if s[:1] in ('+', '-') else s
+        if digits.isdecimal():
             return int(s)
+        if '_' in s and '.' not in s:
+            # int() also takes digit groups like 1_000
+            try:
+                return int(s)
+            except ValueError:
+                pass
+        try:
+            return float(s)
         except ValueError:
-            try: 
-                return float(s)
-            except ValueError: 
-                return None
+            return None
+
+    def _op_numeric(self, field, op, value, profile_value):
+        rule_num = self._safe_cast_number(value)
+        prof_num = self._safe_cast_number(profile_value)
+        if rule_num is None or prof_num is None:
+            return False, f"FAIL: Non-numeric values for '{field}'."
+        status = _NUMERIC_OPS[op](prof_num, rule_num)
+        return status, f"{'PASS' if status else 'FAIL'}: {field} ({prof_num}) {op} {rule_num}."
+
+    def _op_in(self, field, op, value, profile_value):
+        if isinstance(profile_value, list):
+            prof_values = [str(x).lower() for x in profile_value]
+        else:
+            prof_values = [str(profile_value).lower()]
+
+        if isinstance(value, list):
+            rule_values = [str(x).lower() for x in value]
+        else:
+            rule_values = [str(value).lower()]
+
+        if op == "in":
+            status = any(pv in rule_values for pv in prof_values)
+            return status, f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) {'is' if status else 'is not'} in required set {value}."
+        status = not any(pv in rule_values for pv in prof_values)
+        return status, f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) exclusion check passed."
+
+    def _op_eq(self, field, op, value, profile_value):
+        if isinstance(value, bool):
+            status = bool(profile_value) == value
+        else:
+            status = str(profile_value).lower() == str(value).lower()
+        return status, f"{'PASS' if status else 'FAIL'}: {field} matches {value}."
+
+    def _op_ne(self, field, op, value, profile_value):
+        status = str(profile_value).lower() != str(value).lower()
+        return status, f"{'PASS' if status else 'FAIL'}: {field} does not match {value}."
+
+    _OPS = {
+        ">": _op_numeric,
+        "<": _op_numeric,
+        ">=": _op_numeric,
+        "<=": _op_numeric,
+        "in": _op_in,
+        "not_in": _op_in,
+        "==": _op_eq,
+        "!=": _op_ne,
+    }
 
     def _evaluate_rule(self, profile: dict, rule: dict) -> dict:
         field = rule.get('field')
         op = rule.get('op')
         value = rule.get('value')
+        rule_str = f"{field} {op} {value}"
 
         profile_value = profile.get(field)
 
         if profile_value is None:
-            status = None  
-            explanation = f"SKIPPED: Profile missing field '{field}'."
             return {
-                "rule": f"{field} {op} {value}", 
+                "rule": rule_str, 
                 "status": None, 
                 "profile_value": None, 
-                "explanation": explanation, 
+                "explanation": f"SKIPPED: Profile missing field '{field}'.", 
                 "skipped": True
             }
 
-        if op in (">", "<", ">=", "<="):
-            rule_num = self._safe_cast_number(value)
-            prof_num = self._safe_cast_number(profile_value)
-            
-            if rule_num is None or prof_num is None:
-                status = False
-                explanation = f"FAIL: Non-numeric values for '{field}'."
-            else:
-                if op == ">": 
-                    status = prof_num > rule_num
-                elif op == "<": 
-                    status = prof_num < rule_num
-                elif op == ">=": 
-                    status = prof_num >= rule_num
-                elif op == "<=": 
-                    status = prof_num <= rule_num
-                else: 
-                    status = False
-                explanation = f"{'PASS' if status else 'FAIL'}: {field} ({prof_num}) {op} {rule_num}."
-            
-            return {
-                "rule": f"{field} {op} {value}", 
-                "status": status, 
-                "profile_value": profile_value, 
-                "explanation": explanation, 
-                "skipped": False
-            }
+        handler = self._OPS.get(op)
+        if handler is None:
+            return _outcome(rule_str, False, profile_value, f"ERROR: Unknown operator '{op}'")
+
+        status, explanation = handler(self, field, op, value, profile_value)
+        return _outcome(rule_str, status, profile_value, explanation)
+
+    def _compile_rule(self, rule: dict) -> tuple:
+        field = rule.get('field')
+        if isinstance(field, str):
+            # interned here and in normalize(), so view lookups hit the identity fast path
+            field = sys.intern(field)
+        op = rule.get('op')
+        value = rule.get('value')
+        rule_str = f"{field} {op} {value}"
+
+        # test() gives the status, explain() builds the message only when a caller wants it
+        if op in _NUMERIC_OPS:
+            compare = _NUMERIC_OPS[op]
+            cast = self._safe_cast_number
+            rule_num = cast(value)
+
+            def test(pf):
+                if rule_num is None or pf.num is None:
+                    return False
+                return compare(pf.num, rule_num)
+
+            def explain(pf, status):
+                prof_num = pf.num
+                if rule_num is None or prof_num is None:
+                    return f"FAIL: Non-numeric values for '{field}'."
+                return f"{'PASS' if status else 'FAIL'}: {field} ({prof_num}) {op} {rule_num}."
+            return field, rule_str, test, explain
 
         if op in ("in", "not_in"):
-            if isinstance(profile_value, list):
-                prof_values = [str(x).lower() for x in profile_value]
-            else:
-                prof_values = [str(profile_value).lower()]
+            rule_values = frozenset(str(x).lower() for x in (value if isinstance(value, list) else [value]))
+            negate = op == "not_in"
 
-            if isinstance(value, list):
-                rule_values = [str(x).lower() for x in value]
-            else:
-                rule_values = [str(value).lower()]
+            def test(pf):
+                hit = not rule_values.isdisjoint(pf.lowers)
+                return hit != negate
 
-            if op == "in":
-                status = any(pv in rule_values for pv in prof_values)
-                explanation = f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) {'is' if status else 'is not'} in required set {value}."
-            else:  # not_in
-                status = not any(pv in rule_values for pv in prof_values)
-                explanation = f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) exclusion check passed."
+            def explain(pf, status):
+                profile_value = pf.raw
+                if negate:
+                    return f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) exclusion check passed."
+                return f"{'PASS' if status else 'FAIL'}: {field} ({profile_value}) {'is' if status else 'is not'} in required set {value}."
+            return field, rule_str, test, explain
 
-            return {
-                "rule": f"{field} {op} {value}", 
-                "status": status, 
-                "profile_value": profile_value, 
-                "explanation": explanation, 
-                "skipped": False
-            }
+        if op in ("==", "!="):
+            is_bool = op == "==" and isinstance(value, bool)
+            negate = op == "!="
+            target = str(value).lower()
+            verb = "does not match" if negate else "matches"
 
-        if op == "==":
-            if isinstance(value, bool):
-                status = bool(profile_value) == value
-            else:
-                status = str(profile_value).lower() == str(value).lower()
-            
-            explanation = f"{'PASS' if status else 'FAIL'}: {field} matches {value}."
-            return {
-                "rule": f"{field} {op} {value}", 
-                "status": status, 
-                "profile_value": profile_value, 
-                "explanation": explanation, 
-                "skipped": False
-            }
+            def test(pf):
+                if is_bool:
+                    return bool(pf.raw) == value
+                return (pf.lower == target) != negate
+
+            def explain(pf, status):
+                return f"{'PASS' if status else 'FAIL'}: {field} {verb} {value}."
+            return field, rule_str, test, explain
+
+        def test(pf):
+            return False
 
-        if op == "!=":
-            status = str(profile_value).lower() != str(value).lower()
-            explanation = f"{'PASS' if status else 'FAIL'}: {field} does not match {value}."
+        def explain(pf, status):
+            return f"ERROR: Unknown operator '{op}'"
+        return field, rule_str, test, explain
+
+    def normalize(self, profile: dict) -> dict:
+        view = {}
+        for field, value in profile.items():
+            if value is None:
+                continue
+            lower = str(value).lower()
+            lowers = [str(x).lower() for x in value] if isinstance(value, list) else [lower]
+            if isinstance(field, str):
+                field = sys.intern(field)
+            view[field] = ProfileField(value, self._safe_cast_number(value), lower, lowers)
+        return view
+
+    def _run_compiled(self, view: dict, compiled_rule: tuple) -> dict:
+        field, rule_str, test, explain = compiled_rule
+        pf = view.get(field)
+        if pf is None:
             return {
-                "rule": f"{field} {op} {value}", 
-                "status": status, 
-                "profile_value": profile_value, 
-                "explanation": explanation, 
-                "skipped": False
+                "rule": rule_str,
+                "status": None,
+                "profile_value": None,
+                "explanation": f"SKIPPED: Profile missing field '{field}'.",
+                "skipped": True
             }
+        status = test(pf)
+        return _outcome(rule_str, status, pf.raw, explain(pf, status))
 
-        return {
-            "rule": f"{field} {op} {value}", 
-            "status": False, 
-            "profile_value": profile_value, 
-            "explanation": f"ERROR: Unknown operator '{op}'", 
-            "skipped": False
-        }
+    def _test_compiled(self, view: dict, compiled_rule: tuple):
+        pf = view.get(compiled_rule[0])
+        if pf is None:
+            return None
+        return compiled_rule[2](pf)
 
-    def evaluate(self, profile: dict, rule_ast: dict) -> tuple:
-        
+    def _split(self, rule_ast: dict) -> tuple:
         if 'any' in rule_ast:
-            rules_list = rule_ast.get("any", [])
-            mode = 'any' 
-        else:
-            rules_list = rule_ast.get("all", [])
-            mode = 'all' 
+            return 'any', rule_ast.get("any", [])
+        return 'all', rule_ast.get("all", [])
+
+    def compile(self, rule_ast: dict) -> tuple:
+        mode, rules_list = self._split(rule_ast)
+        checks = [self._compile_rule(r) for r in rules_list]
+        return mode, rules_list, checks, frozenset(c[0] for c in checks)
+
+    def _tally(self, mode, rules_list, results) -> tuple:
+        final_eligibility, score, outcomes, failed_rules, skipped_rules = self._tally_counts(mode, rules_list, results)
+        return final_eligibility, score, outcomes
 
+    def _tally_counts(self, mode, rules_list, results) -> tuple:
         total_rules = len(rules_list)
         passing_rules = 0
-        failed_rules = 0  Track explicit rule failures
+        failed_rules = 0  # Track explicit rule failures
+        skipped_rules = 0
         outcomes = []
 
         if total_rules == 0:
-            return False, 0.0, [{"error": "Empty rule set"}]
+            return False, 0.0, [{"error": "Empty rule set"}], 0, 0
 
-        for r in rules_list:
-            out = self._evaluate_rule(profile, r)
+        for r, out in zip(rules_list, results):
             out['atom'] = r 
             out['msg'] = out['explanation']
             outcomes.append(out)
             
             if out['skipped']:
+                skipped_rules += 1
                 continue 
             
             if out['status']:
@@ -163,7 +281,78 @@ class MatchingEngine:
         else: 
             final_eligibility = (failed_rules == 0)
 
-        return final_eligibility, score, outcomes
+        return final_eligibility, score, outcomes, failed_rules, skipped_rules
+
+    def evaluate(self, profile: dict, rule_ast: dict) -> tuple:
+        mode, rules_list = self._split(rule_ast)
+        return self._tally(mode, rules_list, (self._evaluate_rule(profile, r) for r in rules_list))
+
+    def evaluate_compiled(self, profile: dict, compiled: tuple, view: dict = None) -> tuple:
+        if view is None:
+            view = self.normalize(profile)
+        mode, rules_list, checks, fields = compiled
+        return self._tally(mode, rules_list, (self._run_compiled(view, c) for c in checks))
+
+    def evaluate_compiled_flags(self, profile: dict, compiled: tuple, view: dict = None) -> tuple:
+        # evaluate_compiled plus whether any atom failed / was skipped, from the tally's own counters
+        if view is None:
+            view = self.normalize(profile)
+        mode, rules_list, checks, fields = compiled
+        passed, score, outcomes, failed_rules, skipped_rules = self._tally_counts(
+            mode, rules_list, (self._run_compiled(view, c) for c in checks))
+        return passed, score, outcomes, failed_rules > 0, skipped_rules > 0
+
+    def summarize_compiled(self, profile: dict, compiled: tuple, view: dict = None) -> tuple:
+        mode, rules_list, checks, fields = compiled
+        if not checks:
+            return False, 0.0, False, False
+
+        if view is None:
+            view = self.normalize(profile)
+        if fields.isdisjoint(view):
+            # profile has none of the fields this rule looks at: every atom is skipped
+            return mode != 'any', 0.0, False, True
+        passing_rules = failed_rules = skipped_rules = 0
+        for c in checks:
+            status = self._test_compiled(view, c)
+            if status is None:
+                skipped_rules += 1
+            elif status:
+                passing_rules += 1
+            else:
+                failed_rules += 1
+
+        score = passing_rules / len(checks)
+        if mode == 'any':
+            final_eligibility = (passing_rules > 0)
+        else:
+            final_eligibility = (failed_rules == 0)
+        return final_eligibility, score, failed_rules > 0, skipped_rules > 0
+
+    def _eligible(self, mode, statuses) -> bool:
+        # same verdict as _tally, but stops at the first rule that decides it
+        seen = False
+        for status in statuses:
+            seen = True
+            if status is None:
+                continue
+            if mode == 'any' and status:
+                return True
+            if mode != 'any' and not status:
+                return False
+        return seen and mode != 'any'
+
+    def is_eligible(self, profile: dict, rule_ast: dict) -> bool:
+        mode, rules_list = self._split(rule_ast)
+        return self._eligible(mode, (self._evaluate_rule(profile, r)['status'] for r in rules_list))
+
+    def is_eligible_compiled(self, profile: dict, compiled: tuple, view: dict = None) -> bool:
+        if view is None:
+            view = self.normalize(profile)
+        mode, rules_list, checks, fields = compiled
+        if checks and fields.isdisjoint(view):
+            return mode != 'any'
+        return self._eligible(mode, (self._test_compiled(view, c) for c in checks))
 
 engine = MatchingEngine()
 
@@ -174,32 +363,287 @@ def evaluate_rule_with_details(rule, profile):
     except Exception as e:
         return False, 0.0, [{'error': str(e)}]
 
-def evaluate_rules_for_profile(profile):
-    schemes = Scheme.query.order_by(Scheme.title).all()
-    results = []
+def evaluate_compiled_with_details(compiled, profile, view=None):
+    try:
+        return engine.evaluate_compiled_flags(profile, compiled, view)
+    except Exception as e:
+        return False, 0.0, [{'error': str(e)}], False, False
+
+def summarize_compiled(compiled, profile, view=None):
+    try:
+        return engine.summarize_compiled(profile, compiled, view)
+    except Exception:
+        return False, 0.0, False, False
+
+def _compile_or_none(rule_json, memo=None, previous=None):
+    # identical rule JSON (common for parser output) shares one compiled closure set
+    key = None
+    if memo is not None:
+        try:
+            key = json.dumps(rule_json, sort_keys=True)
+        except (TypeError, ValueError):
+            key = None
+        if key is not None:
+            if key in memo:
+                return memo[key]
+            if previous and key in previous:
+                memo[key] = previous[key]
+                return memo[key]
+    try:
+        compiled = engine.compile(rule_json)
+    except Exception:
+        compiled = None
+    if key is not None:
+        memo[key] = compiled
+    return compiled
+
+def _top_rules(rules, n):
+    # verified first, then by confidence; the survivors keep their id order
+    ranked = sorted(rules, key=lambda r: (not r['verified'], -(r['parser_confidence'] or 0.0)))
+    keep = {id(r) for r in ranked[:n]}
+    return [r for r in rules if id(r) in keep]
+
+def _scheme_fields(rules):
+    # every profile field the scheme's rules look at, or None when a rule can't be
+    # judged from its fields alone (not compiled, or no atoms)
+    if not rules or any(r['compiled'] is None or not r['compiled'][2] for r in rules):
+        return None
+    return frozenset().union(*(r['compiled'][3] for r in rules))
+
+def load_schemes(force=False):
+    global _compiled_memo
+    cached = _rules_cache["schemes"]
+    if not force and cached is not None and time.monotonic() - _rules_cache["at"] < RULES_CACHE_TTL:
+        return cached
+
+    # plain column rows, no Scheme/SchemeRule objects; streamed in batches
+    # (server-side cursor on psycopg2) instead of fetching everything
+    on = SchemeRule.scheme_id == Scheme.id
+    if RULES_MIN_CONFIDENCE:
+        # filtered in the join so schemes left without rules still come back
+        on = and_(on, or_(SchemeRule.verified.is_(True),
+                          SchemeRule.parser_confidence >= float(RULES_MIN_CONFIDENCE)))
+    rows = db.session.execute(
+        select(Scheme.id, Scheme.title, Scheme.description,
+               SchemeRule.id.label('rule_id'), SchemeRule.rule_json,
+               SchemeRule.snippet, SchemeRule.parser_confidence, SchemeRule.verified)
+        .outerjoin(SchemeRule, on)
+        .order_by(Scheme.title, Scheme.id, SchemeRule.id)
+        .execution_options(yield_per=RULES_LOAD_BATCH)
+    )
+
+    # seed from the last load so unchanged rules aren't recompiled; keep only live ones
+    previous, memo = _compiled_memo, {}
+    schemes = []
+    current = None
+    for r in rows:
+        if current is None or current['scheme_id'] != r.id:
+            current = {
+                'scheme_id': r.id,
+                'title': r.title,
+                'description': r.description,
+                'rules': []
+            }
+            schemes.append(current)
+        if r.rule_id is not None:
+            current['rules'].append({
+                'id': r.rule_id,
+                'rule_json': r.rule_json,
+                'compiled': _compile_or_none(r.rule_json, memo, previous),
+                'snippet': r.snippet,
+                'parser_confidence': r.parser_confidence,
+                'verified': r.verified
+            })
+
+    for sc in schemes:
+        if RULES_MAX_PER_SCHEME and len(sc['rules']) > RULES_MAX_PER_SCHEME:
+            sc['rules'] = _top_rules(sc['rules'], RULES_MAX_PER_SCHEME)
+        sc['fields'] = _scheme_fields(sc['rules'])
 
+    _compiled_memo = memo
+    _rules_cache["schemes"] = schemes
+    _rules_cache["at"] = time.monotonic()
+    _rules_cache["gen"] += 1
+    return schemes
+
+def refresh_rules_cache():
+    with _details_lock:
+        _details_cache.clear()
+        _results_cache.clear()
+        _scheme_cache.clear()
+    # rebuild, then swap; requests already iterating the old snapshot keep it
+    return load_schemes(force=True)
+
+def profile_key(profile):
+    # short digest of the canonical profile JSON; None if it can't be serialised
+    try:
+        canonical = json.dumps(profile, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+def evaluate_rule_cached(rule_id, rule, profile, key_of_profile=None):
+    if key_of_profile is None:
+        key_of_profile = profile_key(profile)
+    if key_of_profile is None:
+        return evaluate_rule_with_details(rule, profile)
+    key = (rule_id, key_of_profile)
+
+    with _details_lock:
+        hit = _details_cache.get(key)
+        # the stored rule guards against edits made by another worker
+        if hit is not None and hit[0] == rule:
+            _details_cache.move_to_end(key)
+            return hit[1]
+
+    passed, score, details = evaluate_rule_with_details(rule, profile)
+    # shared between requests, so hand out an immutable sequence
+    result = (passed, score, tuple(details))
+    with _details_lock:
+        _details_cache[key] = (rule, result)
+        if len(_details_cache) > DETAILS_CACHE_SIZE:
+            _details_cache.popitem(last=False)
+    return result
+
+def _fetch_scheme(scheme_id):
+    rows = db.session.execute(
+        select(Scheme.id, Scheme.title, Scheme.description, Scheme.source_url,
+               SchemeRule.id.label('rule_id'), SchemeRule.rule_json,
+               SchemeRule.snippet, SchemeRule.parser_confidence)
+        .outerjoin(SchemeRule, SchemeRule.scheme_id == Scheme.id)
+        .where(Scheme.id == scheme_id)
+        .order_by(SchemeRule.id)
+    ).all()
+    if not rows:
+        return None
+    first = rows[0]
+    rules = tuple(
+        RuleView(r.rule_id, r.rule_json, r.snippet, r.parser_confidence)
+        for r in rows if r.rule_id is not None
+    )
+    return SchemeView(first.id, first.title, first.description, first.source_url, rules)
+
+def get_scheme(scheme_id):
+    # dropped on any rules rebuild and otherwise after RULES_CACHE_TTL, without
+    # loading the whole catalogue just to look at one scheme
+    gen = _rules_cache["gen"]
+    with _details_lock:
+        hit = _scheme_cache.get(scheme_id)
+        if hit is not None and hit[0] == gen and time.monotonic() - hit[1] < RULES_CACHE_TTL:
+            _scheme_cache.move_to_end(scheme_id)
+            return hit[2]
+
+    scheme = _fetch_scheme(scheme_id)
+    if scheme is None:
+        return None
+    with _details_lock:
+        _scheme_cache[scheme_id] = (gen, time.monotonic(), scheme)
+        if len(_scheme_cache) > SCHEME_CACHE_SIZE:
+            _scheme_cache.popitem(last=False)
+    return scheme
+
+def _copy_results(rows):
+    # cached rows are shared by every request with the same profile; callers get their own
+    return [dict(r, reasons=dict(r['reasons'])) for r in rows]
+
+def evaluate_rules_for_profile(profile, details=True):
+    schemes = load_schemes()
+    key_of_profile = profile_key(profile)
+    if key_of_profile is None:
+        return _evaluate_profile(profile, schemes, details)
+    key = (key_of_profile, details)
+
+    with _details_lock:
+        hit = _results_cache.get(key)
+        # only valid for the rules snapshot it was computed against
+        if hit is not None and hit[0] is schemes:
+            _results_cache.move_to_end(key)
+            return _copy_results(hit[1])
+
+    results = tuple(_evaluate_profile(profile, schemes, details))
+    with _details_lock:
+        _results_cache[key] = (schemes, results)
+        if len(_results_cache) > RESULTS_CACHE_SIZE:
+            _results_cache.popitem(last=False)
+    return _copy_results(results)
+
+def iter_rules_for_profile(profile, details=True):
+    # unsorted, one result dict per scheme as it is evaluated; for callers that stream
+    return _iter_profile(profile, load_schemes(), details)
+
+def _evaluate_profile(profile, schemes, details):
+    return sorted(_iter_profile(profile, schemes, details), key=lambda x: (-x['score'], x['title']))
+
+def _iter_profile(profile, schemes, details):
+    try:
+        view = engine.normalize(profile)
+    except Exception:
+        view = None
+
+    # rules with identical JSON share a compiled object, so evaluate each one once
+    seen = {}
     for s in schemes:
-        rules = SchemeRule.query.filter_by(scheme_id=s.id).all()
+        rules = s['rules']
+        fields = s['fields']
+        if not details and view is not None and fields is not None and fields.isdisjoint(view):
+            # nothing in the profile is relevant: every atom would be skipped,
+            # which always comes out as the first rule at 0% 'Maybe Eligible'
+            r = rules[0]
+            yield {
+                'scheme_id': s['scheme_id'],
+                'title': s['title'],
+                'description': s['description'],
+                'result': 'Maybe Eligible',
+                'score': 0.0,
+                'reasons': {
+                    'snippet': r['snippet'],
+                    'parser_confidence': r['parser_confidence'],
+                    'rule_id': r['id']
+                }
+            }
+            continue
+
         best_score = -1.0
         best_passed = False
+        best_flags = (False, False)
         best_details = {'note': 'No eligibility rule defined yet'}
 
         if rules:
             for r in rules:
                 try:
-                    rule_obj = r.rule_json
-                    passed, score, details = evaluate_rule_with_details(rule_obj, profile)
+                    compiled = r['compiled']
+                    if compiled is not None and id(compiled) in seen:
+                        passed, score, failed_any, skipped_any, evaluations = seen[id(compiled)]
+                    elif details or compiled is None:
+                        if compiled is not None:
+                            passed, score, evaluations, failed_any, skipped_any = evaluate_compiled_with_details(compiled, profile, view)
+                        else:
+                            passed, score, evaluations = evaluate_rule_with_details(r['rule_json'], profile)
+                            failed_any = any(d.get('status') is False for d in evaluations)
+                            skipped_any = any(d.get('skipped') for d in evaluations)
+                    else:
+                        # list views only need the label and score, so no per-rule records
+                        passed, score, failed_any, skipped_any = summarize_compiled(compiled, profile, view)
+                        evaluations = None
+                    if evaluations is not None:
+                        # may be handed to several schemes (and cached), so not a list
+                        evaluations = tuple(evaluations)
+                    if compiled is not None:
+                        seen[id(compiled)] = (passed, score, failed_any, skipped_any, evaluations)
                     if score > best_score:
                         best_score = score
                         best_passed = passed
+                        best_flags = (failed_any, skipped_any)
                         best_details = {
-                            'snippet': getattr(r, 'snippet', None),
-                            'parser_confidence': getattr(r, 'parser_confidence', None),
-                            'rule_id': getattr(r, 'id', None),
-                            'evaluations': details
+                            'snippet': r['snippet'],
+                            'parser_confidence': r['parser_confidence'],
+                            'rule_id': r['id']
                         }
+                        if evaluations is not None:
+                            best_details['evaluations'] = evaluations
                 except Exception as e:
                     best_details = {'error': str(e)}
+                    best_flags = (False, False)
         else:
             best_score = 0.0
 
@@ -208,12 +652,7 @@ def evaluate_rules_for_profile(profile):
         
         score_percent = float(best_score) * 100.0
 
-        skipped_any = False
-        failed_any = False
-        
-        if 'evaluations' in best_details and isinstance(best_details['evaluations'], list):
-            skipped_any = any(d.get('skipped') for d in best_details['evaluations'])
-            failed_any = any(d.get('status') is False for d in best_details['evaluations'])
+        failed_any, skipped_any = best_flags
 
         if failed_any:
             label = 'Not Eligible'  
@@ -224,23 +663,18 @@ def evaluate_rules_for_profile(profile):
         else:
             label = 'Not Eligible'  
 
-        results.append({
-            'scheme_id': s.id,
-            'title': s.title,
-            'description': s.description,
+        yield {
+            'scheme_id': s['scheme_id'],
+            'title': s['title'],
+            'description': s['description'],
             'result': label,
             'score': round(score_percent, 2),
             'reasons': best_details
-        })
-
-    results = sorted(results, key=lambda x: (-x['score'], x['title']))
-    return results
+        }
 
 
 def evaluate_rule(rule, profile):
-    passed, score, details = evaluate_rule_with_details(rule, profile)
-    return bool(passed)
-   
-def evaluate_rule(rule, profile):
-    passed, score, details = evaluate_rule_with_details(rule, profile)
-    return bool(passed)
\ No newline at end of file
+    try:
+        return engine.is_eligible(profile, rule)
+    except Exception:
+        return False
\ No newline at end of file
@@ -1,16 +1,22 @@
+from sqlalchemy.dialects.postgresql import JSONB
 from db import db
-from datetime import datetime
-import json
+from datetime import datetime, timezone
+
+def _utcnow():
+    # naive UTC like the existing rows, without the deprecated datetime.utcnow()
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class Scheme(db.Model):
     __tablename__ = "schemes"
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String, nullable=False)
-    state = db.Column(db.String, nullable=True) 
+    title = db.Column(db.String, nullable=False, index=True)
+    state = db.Column(db.String, nullable=True, index=True)
     description = db.Column(db.Text) 
     source_url = db.Column(db.String)
     last_scraped = db.Column(db.DateTime)
-    raw_html_path = db.Column(db.String)
+    # never read by the web views, so keep it out of the default SELECT
+    raw_html_path = db.deferred(db.Column(db.String))
+    rules = db.relationship("SchemeRule", back_populates="scheme", order_by="SchemeRule.id", lazy="raise")
 
     def to_dict(self):
         return {
@@ -24,17 +30,23 @@ class Scheme(db.Model):
 
 class SchemeRule(db.Model):
     __tablename__ = "scheme_rules"
+    # GIN only exists on Postgres; elsewhere the column is plain JSON text with no index
+    __table_args__ = (
+        db.Index("ix_scheme_rules_rule_json_gin", "rule_json", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    scheme_id = db.Column(db.Integer, db.ForeignKey("schemes.id"), nullable=False)
-    rule_json = db.Column(db.JSON)
+    scheme_id = db.Column(db.Integer, db.ForeignKey("schemes.id"), nullable=False, index=True)
+    # stored pre-parsed as jsonb on Postgres so containment queries can use the GIN index
+    rule_json = db.Column(db.JSON().with_variant(JSONB(), "postgresql"))
     snippet = db.Column(db.Text) 
     parser_confidence = db.Column(db.Float, default=0.0)
     verified = db.Column(db.Boolean, default=False)
+    scheme = db.relationship("Scheme", back_populates="rules", lazy="raise")
 
 class UserProfile(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
-    created = db.Column(db.DateTime, default=datetime.utcnow)
+    created = db.Column(db.DateTime, default=_utcnow)
     email = db.Column(db.String, unique=True, nullable=True)
     password_hash = db.Column(db.String, nullable=True)
     name = db.Column(db.String, nullable=True)
@@ -43,10 +55,15 @@ class UserProfile(db.Model):
 
 class MatchResult(db.Model):
     __tablename__ = "matches"
+    # user_id lookups are served by the leading column of both composites
+    __table_args__ = (
+        db.Index("ix_matches_user_scheme", "user_id", "scheme_id"),
+        db.Index("ix_matches_user_created", "user_id", "created"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    scheme_id = db.Column(db.Integer, db.ForeignKey("schemes.id"))
+    scheme_id = db.Column(db.Integer, db.ForeignKey("schemes.id"), index=True)
     result = db.Column(db.String)
     score = db.Column(db.Float)
     reasons = db.Column(db.JSON)
-    created = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created = db.Column(db.DateTime, default=_utcnow)
\ No newline at end of file
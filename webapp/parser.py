@@ -1,14 +1,26 @@
 import os
+import sys
 import csv
 import re
 import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse
+import orjson
 from bs4 import BeautifulSoup
 
+try:
+    import lxml
+    HTML_PARSER = "lxml"  # libxml2-backed tree builder
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 script_dr = os.path.dirname(os.path.abspath(__file__))
 html_save = os.path.join(script_dr, "output", "raw_html")
 urlss = os.path.join(script_dr, "seedurls.csv")
 op_file = os.path.join(script_dr, "output", "sample_schemes.py")
+op_json = os.path.join(script_dr, "output", "sample_schemes.json")
 
 h_keywords = [
     "eligibility", "eligibility criteria", "who can apply", "who is eligible",
@@ -29,14 +41,34 @@ states = [
     "Delhi","Jammu and Kashmir","Ladakh"
 ]
 
-
+_RE_CRLF = re.compile(r"\r\n?")
+_RE_BULLETS = re.compile(r"[\u2022\u2023\u25E6\u2043\u2219]")
+_RE_BLANKLINES = re.compile(r"\n\s*\n+")
+_RE_SPACES = re.compile(r"[ \t]+")
+_RE_HX = re.compile(r"^h[1-3]$")
+_RE_HX4 = re.compile(r"h[1-4]", re.I)
+_RE_WORDS = re.compile(r"\b[A-Za-z]+\b")
+# same rule as fetcher.py so both sides derive identical keys
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.-]")
+
+# one C-level scan per text instead of a substring test per keyword/state
+_RE_HEAD_KW = re.compile("|".join(re.escape(k) for k in h_keywords))
+_RE_FB_KW = re.compile("|".join(re.escape(k) for k in fb_words))
+# lookahead so overlapping names are all reported; no state name is a prefix of another
+_RE_STATES = re.compile("(?=(" + "|".join(re.escape(s.lower()) for s in states) + "))")
+_STATE_RANK = {s.lower(): i for i, s in enumerate(states)}
+# reversed so the first state sharing a first word wins, as in the old scan
+_STATE_BY_FIRST_WORD = {s.split()[0].lower(): s for s in reversed(states)}
+
+
+@lru_cache(maxsize=None)
 def url_to_filename(url: str) -> str:
     parsed = urlparse(url)
     domain = parsed.netloc.replace(":", "_")
     path_part = parsed.path.strip("/").replace("/", "_") or "index"
     base = f"{domain}__{path_part}"
-    h = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
-    url_key = "".join(c if c.isalnum() or c in ("-", "_", ".") else "_" for c in f"{base}__{h}")
+    h = hashlib.blake2b(url.encode("utf-8"), digest_size=4).hexdigest()
+    url_key = UNSAFE_FILENAME_CHARS.sub("_", f"{base}__{h}")
     return url_key
 
 
@@ -46,16 +78,20 @@ def load_seed_map(csv_path=urlss):
         print(f"Warning: Seed file not found at {csv_path}")
         return mapping
     with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return mapping
+        # Accept 'url' header or first column fallback; positions are fixed by the header
+        url_idx = header.index("url") if "url" in header else None
         for row in reader:
-            # Accept 'url' header or first column fallback
+            if not row:
+                continue
             url = ""
-            if "url" in row and row["url"].strip():
-                url = row["url"].strip()
-            else:
-                first = next(iter(row.values()), "").strip()
-                if first:
-                    url = first
+            if url_idx is not None and url_idx < len(row):
+                url = row[url_idx].strip()
+            if not url:
+                url = row[0].strip()
             if url:
                 key = url_to_filename(url)
                 mapping[key] = url
@@ -64,19 +100,23 @@ def load_seed_map(csv_path=urlss):
 
 def read_html(path):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
+        with open(path, "rb") as f:
+            html = f.read().decode("utf-8")
     except Exception:
         return None
+    # text mode used to translate line endings; only pay for it when needed
+    if "\r" in html:
+        html = _RE_CRLF.sub("\n", html)
+    return html
 
 
 def clean_text(s):
     if not s:
         return ""
-    s = re.sub(r"\r\n?", "\n", s)
-    s = re.sub(r"\u2022|\u2023|\u25E6|\u2043|\u2219", "-", s)
-    s = re.sub(r"\n\s*\n+", "\n", s)
-    s = re.sub(r"[ \t]+", " ", s)
+    s = _RE_CRLF.sub("\n", s)
+    s = _RE_BULLETS.sub("-", s)
+    s = _RE_BLANKLINES.sub("\n", s)
+    s = _RE_SPACES.sub(" ", s)
     return s.strip()
 
 
@@ -84,28 +124,29 @@ def extract_title(soup, fallback):
     tag = soup.find("title")
     if tag and tag.get_text(strip=True):
         return tag.get_text(strip=True)
-    h1 = soup.find(re.compile(r"^h[1-3]$"))
+    h1 = soup.find(_RE_HX)
     if h1 and h1.get_text(strip=True):
         return h1.get_text(strip=True)
     return fallback
 
 
+_HEADING_LEVELS = {name: i for i, name in enumerate(["h1", "h2", "h3", "h4", "strong", "b"])}
+
+
 def find_heading_candidates(soup):
-    heads = []
-    for level in ["h1", "h2", "h3", "h4", "strong", "b"]:
-        for tag in soup.find_all(level):
-            txt = tag.get_text(" ", strip=True).lower()
-            for kw in h_keywords:
-                if kw in txt:
-                    heads.append(tag)
-                    break
+    # one walk over the tree; the stable sort keeps the old per-level ordering
+    heads = [
+        tag for tag in soup.find_all(list(_HEADING_LEVELS))
+        if _RE_HEAD_KW.search(tag.get_text(" ", strip=True).lower())
+    ]
+    heads.sort(key=lambda tag: _HEADING_LEVELS[tag.name])
     return heads
 
 
 def extract_block_after_heading(tag):
     parts = []
     for sib in tag.find_next_siblings():
-        if sib.name and re.match(r"h[1-4]", sib.name, re.I):
+        if sib.name and _RE_HX4.match(sib.name):
             break
         if sib.name in ("p", "div", "ul", "ol", "table", "dl"):
             parts.append(sib.get_text("\n", strip=True))
@@ -118,103 +159,141 @@ def extract_block_after_heading(tag):
 
 def fallback_search_for_eligibility(soup):
     candidates = []
-    nodes = soup.find_all(["p", "li", "div", "td"])
-    for node in nodes:
+    for node in soup.find_all(["p", "li", "div", "td"]):
         txt = node.get_text(" ", strip=True)
-        if any(k in txt.lower() for k in fb_words):
+        if _RE_FB_KW.search(txt.lower()):
             candidates.append(txt)
-    if candidates:
-        return "\n".join(candidates[:6])
-    return ""
+            # only the first six are kept, so stop flattening nodes once we have them
+            if len(candidates) == 6:
+                break
+    return "\n".join(candidates)
 
 
 def detect_state(text):
     if not text:
         return ""
-    for s in states:
-        if s.lower() in text.lower():
+    # earliest state in list order that appears anywhere, as before
+    found = {m.group(1) for m in _RE_STATES.finditer(text.lower())}
+    if found:
+        return states[min(_STATE_RANK[f] for f in found)]
+    for tok in _RE_WORDS.findall(text):
+        s = _STATE_BY_FIRST_WORD.get(tok.lower())
+        if s:
             return s
-    tokens = re.findall(r"\b[A-Za-z]+\b", text)
-    for tok in tokens:
-        for s in states:
-            if tok.lower() == s.split()[0].lower():
-                return s
     return ""
 
 
+# slotted: no per-entry dict, and orjson serializes it natively in field order
+@dataclass(slots=True)
+class SchemeEntry:
+    title: str = ""
+    description: str = ""
+    state: str = ""
+    source_url: str = ""
+
+
 def build_entry(title, description, state, source_url):
-    return {
-        "title": title if title is not None else "",
-        "description": description if description is not None else "",
-        "state": state if state is not None else "",
-        "source_url": source_url if source_url is not None else ""
-    }
+    return SchemeEntry(
+        title=title if title is not None else "",
+        description=description if description is not None else "",
+        state=state if state is not None else "",
+        source_url=source_url if source_url is not None else ""
+    )
 
 
 def write_output_py(entries, out_path=op_file):
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("# Auto-generated scheme data from web scraping\n")
-        f.write("# # DEBUG: Verify this data looks correct before database import\n")
-        f.write("SAMPLE_SCHEMES = [\n")
-        for e in entries:
-            title = repr(e["title"])
-            desc = repr(e["description"])
-            state = repr(e["state"])
-            src = repr(e["source_url"])
-            f.write(f"    {{'title': {title}, 'description': {desc}, 'state': {state}, 'source_url': {src}}},\n")
-        f.write("]\n")
+    lines = [
+        "# Auto-generated scheme data from web scraping\n",
+        "# # DEBUG: Verify this data looks correct before database import\n",
+        "SAMPLE_SCHEMES = [\n",
+    ]
+    lines.extend(
+        f"    {{'title': {e.title!r}, 'description': {e.description!r}, "
+        f"'state': {e.state!r}, 'source_url': {e.source_url!r}}},\n"
+        for e in entries
+    )
+    lines.append("]\n")
+    # one encode and one write instead of a text-mode write per entry
+    with open(out_path, "wb") as f:
+        f.write("".join(lines).encode("utf-8"))
     print(f"Wrote {len(entries)} entries to: {out_path}")
 
 
-def parse_all_html():
+def write_output_json(entries, out_path=op_json):
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "wb") as f:
+        f.write(orjson.dumps(entries, option=orjson.OPT_INDENT_2))
+    print(f"Wrote {len(entries)} entries to: {out_path}")
+
+
+def output_entries(entries, legacy=False):
+    # the seeder reads the JSON; the .py module is only written on request
+    write_output_json(entries)
+    if legacy:
+        write_output_py(entries)
+
+
+def parse_html_file(fname, source_url):
+    path = os.path.join(html_save, fname)
+    html = read_html(path)
+    if not html:
+        return None
+
+    soup = BeautifulSoup(html, HTML_PARSER)
+    fallback_name = os.path.splitext(fname)[0]
+    title = extract_title(soup, fallback_name)
+
+    description = ""
+    heading_tags = find_heading_candidates(soup)
+    if heading_tags:
+        for h in heading_tags:
+            blk = extract_block_after_heading(h)
+            if blk and len(blk.strip()) > 20:
+                description = blk
+                break
+
+    if not description:
+        description = fallback_search_for_eligibility(soup)
+
+    description = clean_text(description)
+    state = detect_state(" ".join([title, description]))
+
+    return build_entry(title=title, description=description, state=state, source_url=source_url)
+
+
+def parse_all_html(legacy=False):
     seed_map = load_seed_map()
 
     if not os.path.isdir(html_save):
         print(f"No raw HTML directory found: {html_save}")
-        write_output_py([])
+        output_entries([], legacy)
         return
 
-    files = sorted(f for f in os.listdir(html_save) if f.lower().endswith(".html"))
+    # scandir hands back the d_type with each name, so is_file() needs no extra stat
+    with os.scandir(html_save) as it:
+        files = sorted(e.name for e in it if e.name.lower().endswith(".html") and e.is_file())
     if not files:
         print("No .html files found under raw_html.")
-        write_output_py([])
+        output_entries([], legacy)
         return
 
+    source_urls = [seed_map.get(os.path.splitext(fname)[0], "") for fname in files]
+    workers = int(os.getenv("PARSER_WORKERS", "0")) or os.cpu_count()
+
+    # soup parsing is CPU bound, so fan files out across processes; map keeps file order
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        parsed = list(ex.map(parse_html_file, files, source_urls, chunksize=8))
+
     entries = []
-    for fname in files:
-        path = os.path.join(html_save, fname)
-        html = read_html(path)
-        if not html:
+    for fname, entry in zip(files, parsed):
+        if entry is None:
             print(f"[skip] could not read: {fname}")
             continue
-        
-        soup = BeautifulSoup(html, "html.parser")
-        fallback_name = os.path.splitext(fname)[0]
-        title = extract_title(soup, fallback_name)
-
-        description = ""
-        heading_tags = find_heading_candidates(soup)
-        if heading_tags:
-            for h in heading_tags:
-                blk = extract_block_after_heading(h)
-                if blk and len(blk.strip()) > 20:
-                    description = blk
-                    break
-
-        if not description:
-            description = fallback_search_for_eligibility(soup)
-
-        description = clean_text(description)
-        state = detect_state(" ".join([title, description]))
-
-        url_key = os.path.splitext(fname)[0]
-        source_url = seed_map.get(url_key, "")
-
-        entries.append(build_entry(title=title, description=description, state=state, source_url=source_url))
-        print(f"[ok] parsed {fname} -> title: {title} (state='{state}')")
+        entries.append(entry)
+        print(f"[ok] parsed {fname} -> title: {entry.title} (state='{entry.state}')")
 
-    write_output_py(entries)
+    output_entries(entries, legacy)
 
 if __name__ == "__main__":
-    parse_all_html()
\ No newline at end of file
+    parse_all_html(legacy="--legacy" in sys.argv[1:])
\ No newline at end of file
@@ -1,16 +1,38 @@
 # routes.py
+# NOTE: nothing imports this module and app.py does not register it. Its views reuse
+# app.py's endpoint names (index, admin_verify, ...), so importing it next to app.py
+# fails with "View function mapping is overwriting an existing endpoint function".
+# Changes here only keep it consistent with app.py until it is wired up (e.g. as a
+# Blueprint with its own endpoint names); none of it runs in the served app.
 import os
+import atexit
 import json
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+import orjson
 from flask import (
     request, jsonify, render_template, redirect, url_for,
     abort, current_app, session
 )
 
-from app import app
+from markupsafe import escape
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.orm import joinedload, load_only, selectinload, sessionmaker
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+except ImportError:
+    requests = None
+
+from app import app, STATS_CACHE_TTL, check_admin_credentials
 from db import db
 from models import Scheme, SchemeRule, UserProfile, MatchResult
+from matcher import refresh_rules_cache
 
 matcher_type = "none"
 match_profile = None
@@ -25,8 +47,94 @@ except Exception:
     matcher_type = "http"
     app.logger.info("Matcher not available via python import; will use HTTP at %s", MATCHER_HTTP_URL)
 
+# one pooled session for the HTTP matcher: keep-alive instead of a new handshake per request,
+# plus a couple of quick retries on gateway errors (matching is side-effect free)
+_MATCHER_SESSION = None
+if requests is not None:
+    _MATCHER_SESSION = requests.Session()
+    _matcher_adapter = HTTPAdapter(
+        pool_maxsize=int(os.getenv("MATCHER_POOL_SIZE", "32")),
+        max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset(["POST"]))
+    )
+    _MATCHER_SESSION.mount("http://", _matcher_adapter)
+    _MATCHER_SESSION.mount("https://", _matcher_adapter)
+
+# match rows are written off the request path by a small pool with its own sessions;
+# the engine (and its connection pool) is still the app's
+_match_writer = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MATCH_WRITE_WORKERS", "4")), thread_name_prefix="match-writer"
+)
+# drain queued writes on a clean exit (gunicorn's graceful SIGTERM included) instead of dropping them
+atexit.register(_match_writer.shutdown, wait=True)
+with app.app_context():
+    _WriterSession = sessionmaker(bind=db.engine)
+
+
+def _persist_matches(user_id, saved):
+    rows = [dict(row, user_id=user_id) for row in saved]
+    try:
+        with _WriterSession() as s:
+            s.execute(insert(MatchResult), rows)
+            s.commit()
+    except Exception:
+        app.logger.exception("Failed saving %d match results for user %s", len(rows), user_id)
+
+
+# circuit breaker: after MATCHER_BREAKER_FAILS straight failures, answer 503 without calling
+# the matcher for MATCHER_BREAKER_RESET seconds, then let a single request probe it again
+MATCHER_BREAKER_FAILS = int(os.getenv("MATCHER_BREAKER_FAILS", "5"))
+MATCHER_BREAKER_RESET = float(os.getenv("MATCHER_BREAKER_RESET", "10"))
+_breaker = {"failures": 0, "opened_at": 0.0}
+_breaker_lock = threading.Lock()
+
+
+def _matcher_breaker_open():
+    with _breaker_lock:
+        if _breaker["failures"] < MATCHER_BREAKER_FAILS:
+            return False
+        now = time.monotonic()
+        if now - _breaker["opened_at"] >= MATCHER_BREAKER_RESET:
+            # half-open: this caller probes, everyone else waits out another period
+            _breaker["opened_at"] = now
+            return False
+        return True
+
+
+def _matcher_breaker_record(ok):
+    with _breaker_lock:
+        if ok:
+            _breaker["failures"] = 0
+            return
+        _breaker["failures"] += 1
+        if _breaker["failures"] >= MATCHER_BREAKER_FAILS:
+            _breaker["opened_at"] = time.monotonic()
+
+_source_stats_cache = {"at": 0.0, "data": None}
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+
+
+def _parse_admin_cursor(raw):
+    # "<confidence>:<rule id>" of the last row on the previous page
+    try:
+        conf, rule_id = raw.split(":")
+        return float(conf), int(rule_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _has_template(name):
+    return os.path.isfile(os.path.join(app.root_path, "templates", name))
+
+
+# templates ship with the code, so look them up once instead of a stat() per request
+_HAS_INDEX = _has_template("index.html")
+_HAS_MATCH_FORM = _has_template("match_form.html")
+_HAS_ADMIN_INDEX = _has_template("admin_index.html")
+_HAS_ADMIN_VERIFY = _has_template("admin_verify.html")
+
 def check_admin_auth(username, password):
-    return username == os.getenv("ADMIN_USER", "admin") and password == os.getenv("ADMIN_PASS", "password")
+    return check_admin_credentials(username, password)
 
 
 def require_admin(f):
@@ -42,12 +150,11 @@ def require_admin(f):
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template("index.html") if os.path.exists(os.path.join(app.root_path, "templates", "index.html")) else "Gov Schemes - Home"
+    return render_template("index.html") if _HAS_INDEX else "Gov Schemes - Home"
 
 @app.route("/match", methods=["GET"])
 def match_form():
-    template_path = os.path.join(app.root_path, "templates", "match_form.html")
-    if os.path.exists(template_path):
+    if _HAS_MATCH_FORM:
         return render_template("match_form.html")
     return """
     <h2>Profile Input</h2>
@@ -80,8 +187,10 @@ def match_form():
 
 @app.route("/api/scheme/<int:scheme_id>", methods=["GET"])
 def api_scheme(scheme_id):
-    scheme = Scheme.query.get_or_404(scheme_id)
-    rules = SchemeRule.query.filter_by(scheme_id=scheme_id).all()
+    scheme = Scheme.query.options(joinedload(Scheme.rules)).filter_by(id=scheme_id).one_or_none()
+    if scheme is None:
+        abort(404)
+    rules = scheme.rules
     return jsonify({
         "scheme": scheme.to_dict() if hasattr(scheme, "to_dict") else {
             "id": scheme.id, "title": scheme.title, "description": scheme.description, "source_url": scheme.source_url
@@ -105,75 +214,91 @@ def api_match():
         if not profile or not isinstance(profile, dict):
             return jsonify({"error": "Profile JSON required"}), 400
 
+        # run the matcher before touching the database so no connection is held during the call
+        results = []
+        error = None
+        if matcher_type == "python" and match_profile:
+            try:
+                results = match_profile(profile)
+            except Exception as e:
+                app.logger.exception("Matcher (python) failed: %s", e)
+                error = (jsonify({"error": "Internal matcher error", "detail": str(e)}), 500)
+        else:
+            TRY_URL = os.getenv("MATCHER_HTTP_URL", "http://localhost:8000/match")
+            if _matcher_breaker_open():
+                error = (
+                    jsonify({"error": "Matcher service unavailable", "detail": "circuit open"}),
+                    503,
+                    {"Retry-After": str(max(1, round(MATCHER_BREAKER_RESET)))}
+                )
+            else:
+                try:
+                    if _MATCHER_SESSION is None:
+                        raise RuntimeError("requests is not installed")
+                    # (connect, read): a dead matcher fails fast instead of after the full read timeout
+                    resp = _MATCHER_SESSION.post(TRY_URL, json=profile, timeout=(2, 15))
+                    resp.raise_for_status()
+                    results = resp.json()
+                    _matcher_breaker_record(True)
+                except Exception as e:
+                    _matcher_breaker_record(False)
+                    app.logger.exception("Matcher (http) failed: %s", e)
+                    error = (jsonify({"error": "Matcher service unavailable", "detail": str(e)}), 502)
+        if error is None and not isinstance(results, list):
+            error = (jsonify({"error": "Invalid matcher response format"}), 502)
+
         user = None
         if session.get('user_id'):
             try:
-                user = UserProfile.query.get(session.get('user_id'))
+                user = db.session.get(UserProfile, session.get('user_id'))
             except Exception:
                 user = None
         if user:
             user.profile = profile
-            db.session.add(user)
-            db.session.commit()
         else:
             user = UserProfile(profile=profile)
             db.session.add(user)
-            db.session.commit()
-            session['user_id'] = user.id
-
-        results = []
-        if matcher_type == "python" and match_profile:
-            try:
-                results = match_profile(profile)
-            except Exception as e:
-                app.logger.exception("Matcher (python) failed: %s", e)
-                return jsonify({"error": "Internal matcher error", "detail": str(e)}), 500
-        else:
-            TRY_URL = os.getenv("MATCHER_HTTP_URL", "http://localhost:8000/match")
-            try:
-                import requests
-                resp = requests.post(TRY_URL, json=profile, timeout=15)
-                resp.raise_for_status()
-                results = resp.json()
-            except Exception as e:
-                app.logger.exception("Matcher (http) failed: %s", e)
-                return jsonify({"error": "Matcher service unavailable", "detail": str(e)}), 502
+        db.session.commit()
+        session['user_id'] = user.id
 
-        if not isinstance(results, list):
-            return jsonify({"error": "Invalid matcher response format"}), 502
+        if error is not None:
+            return error
 
         saved = []
         for r in results:
             try:
-                scheme_id = int(r.get("scheme_id"))
-                result_label = r.get("result", "not")
-                score = r.get("score")
-                reasons = r.get("reasons", {})
-                mr = MatchResult(user_id=user.id, scheme_id=scheme_id, result=result_label, score=score, reasons=reasons)
-                db.session.add(mr)
                 saved.append({
-                    "scheme_id": scheme_id,
-                    "result": result_label,
-                    "score": score,
-                    "reasons": reasons
+                    "scheme_id": int(r.get("scheme_id")),
+                    "result": r.get("result", "not"),
+                    "score": r.get("score"),
+                    "reasons": r.get("reasons", {})
                 })
             except Exception:
                 app.logger.exception("Failed saving match result: %s", r)
-        db.session.commit()
+        if saved:
+            _match_writer.submit(_persist_matches, user.id, saved)
 
         return jsonify({"user_id": user.id, "results": saved}), 200
 
     except Exception as e:
+        db.session.rollback()
         app.logger.exception("Unhandled /api/match error")
         return jsonify({"error": "Internal server error", "detail": str(e)}), 500
 
 
 @app.route("/api/stats/schemes_by_state", methods=["GET"])
 def stats_schemes_by_state():
+    cached = _source_stats_cache["data"]
+    if cached is not None and time.monotonic() - _source_stats_cache["at"] < STATS_CACHE_TTL:
+        return app.response_class(cached, mimetype=app.json.mimetype)
     try:
         from sqlalchemy import func
         rows = db.session.query(Scheme.source_url, func.count(Scheme.id)).group_by(Scheme.source_url).all()
-        return jsonify([{"source_url": r[0], "count": r[1]} for r in rows])
+        # counts only move when the seeder runs; cache the encoded body for STATS_CACHE_TTL
+        body = jsonify([{"source_url": r[0], "count": r[1]} for r in rows]).get_data()
+        _source_stats_cache["data"] = body
+        _source_stats_cache["at"] = time.monotonic()
+        return app.response_class(body, mimetype=app.json.mimetype)
     except Exception as e:
         app.logger.exception("Error computing stats")
         return jsonify({"error": "Failed to compute stats", "detail": str(e)}), 500
@@ -182,15 +307,36 @@ def stats_schemes_by_state():
 @require_admin
 def admin_index():
     try:
-        pending = SchemeRule.query.filter_by(verified=False).order_by(SchemeRule.parser_confidence.asc()).limit(200).all()
-        template_path = os.path.join(app.root_path, "templates", "admin_index.html")
-        if os.path.exists(template_path):
-            return render_template("admin_index.html", pending=pending)
-        html = "<h1>Admin - Pending Rules</h1><ul>"
-        for r in pending:
-            html += f"<li>Rule #{r.id} (scheme={r.scheme_id}) - confidence={r.parser_confidence} - <a href='{url_for('admin_verify', rule_id=r.id)}'>verify</a></li>"
-        html += "</ul>"
-        return html
+        # keyset pagination on (confidence, id): each page resumes after the last row shown, no OFFSET
+        confidence = func.coalesce(SchemeRule.parser_confidence, 0.0)
+        query = SchemeRule.query.filter_by(verified=False)
+        cursor = _parse_admin_cursor(request.args.get("cursor"))
+        if cursor:
+            after_conf, after_id = cursor
+            query = query.filter(or_(confidence > after_conf, and_(confidence == after_conf, SchemeRule.id > after_id)))
+        query = query.order_by(confidence.asc(), SchemeRule.id.asc()).limit(ADMIN_PAGE_SIZE)
+
+        if _HAS_ADMIN_INDEX:
+            # the template may follow rule.scheme; fetch those in one extra query rather than per row
+            pending = query.options(selectinload(SchemeRule.scheme)).all()
+        else:
+            # the inline list only shows ids and confidence, so leave the JSON and snippet columns behind
+            pending = query.options(load_only(SchemeRule.id, SchemeRule.scheme_id, SchemeRule.parser_confidence)).all()
+        next_cursor = None
+        if len(pending) == ADMIN_PAGE_SIZE:
+            last = pending[-1]
+            next_cursor = f"{last.parser_confidence or 0.0}:{last.id}"
+
+        if _HAS_ADMIN_INDEX:
+            return render_template("admin_index.html", pending=pending, next_cursor=next_cursor)
+        # build the verify URL once and append ids, rather than a url_for() round per row
+        verify_base = url_for("admin_verify", rule_id=0).rsplit("/", 1)[0]
+        items = "".join(
+            f"<li>Rule #{r.id} (scheme={r.scheme_id}) - confidence={r.parser_confidence} - <a href='{verify_base}/{r.id}'>verify</a></li>"
+            for r in pending
+        )
+        more = f"<a href='{url_for('admin_index', cursor=next_cursor)}'>next</a>" if next_cursor else ""
+        return f"<h1>Admin - Pending Rules</h1><ul>{items}</ul>{more}"
     except Exception as e:
         app.logger.exception("Admin index error")
         return "Admin error", 500
@@ -199,7 +345,7 @@ def admin_index():
 @app.route("/admin/verify/<int:rule_id>", methods=["GET", "POST"])
 @require_admin
 def admin_verify(rule_id):
-    rule = SchemeRule.query.get_or_404(rule_id)
+    rule = db.get_or_404(SchemeRule, rule_id)
     if request.method == "POST":
         raw = request.form.get("rule_json") or request.get_data(as_text=True)
         if not raw:
@@ -211,17 +357,22 @@ def admin_verify(rule_id):
         rule.rule_json = parsed
         rule.verified = True
         db.session.commit()
+        refresh_rules_cache()
         return redirect(url_for("admin_index"))
-    template_path = os.path.join(app.root_path, "templates", "admin_verify.html")
-    if os.path.exists(template_path):
+    if _HAS_ADMIN_VERIFY:
         return render_template("admin_verify.html", rule=rule)
+    try:
+        rule_json_str = orjson.dumps(rule.rule_json or {}, option=orjson.OPT_INDENT_2).decode()
+    except TypeError:
+        rule_json_str = json.dumps(rule.rule_json or {}, indent=2)
+    # scraped snippets and admin-entered JSON must not be able to inject markup
     return f"""
     <h2>Verify Rule #{rule.id} (scheme {rule.scheme_id})</h2>
     <h3>Original snippet</h3>
-    <pre>{rule.snippet or ''}</pre>
+    <pre>{escape(rule.snippet or '')}</pre>
     <h3>Current JSON</h3>
     <form method="post">
-      <textarea name="rule_json" style="width:100%;min-height:300px;">{json.dumps(rule.rule_json or {}, indent=2)}</textarea>
+      <textarea name="rule_json" style="width:100%;min-height:300px;">{escape(rule_json_str)}</textarea>
       <br><button type="submit">Save & Verify</button>
     </form>
     """
@@ -236,7 +387,7 @@ def admin_update_rule():
         new_rule = payload.get("rule_json")
         if not rule_id or new_rule is None:
             return jsonify({"error": "rule_id and rule_json required"}), 400
-        rule = SchemeRule.query.get_or_404(rule_id)
+        rule = db.get_or_404(SchemeRule, rule_id)
         rule.rule_json = new_rule
         rule.verified = True
         if "parser_confidence" in payload:
@@ -245,6 +396,7 @@ def admin_update_rule():
             except Exception:
                 pass
         db.session.commit()
+        refresh_rules_cache()
         return jsonify({"ok": True, "rule_id": rule.id}), 200
     except Exception as e:
         app.logger.exception("admin_update_rule failed")
@@ -1,47 +1,123 @@
 import re
 import json
+import copy
+from functools import lru_cache
 from typing import List
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+INDIAN_JOBS = [
+    "farmer", "engineer", "software developer", "doctor", "nurse",
+    "teacher", "professor", "student", "labourer", "shopkeeper",
+    "manager", "police", "soldier", "army", "government employee",
+    "civil servant", "artisan", "fisherman", "driver", "chef",
+    "electrician", "plumber", "carpenter", "accountant", "banker",
+    "business owner", "entrepreneur", "cleaner", "security guard",
+    "architect", "journalist", "photographer", "lawyer", "advocate",
+    "researcher", "scientist", "delivery agent", "rickshaw puller",
+    "tailor", "mechanic", "welder", "data entry operator", "clerk",
+    "home maker", "housewife", "unemployed", "retired"
+]
+
+_PATTERNS = {
+    'age_between': r'(?:age(?:d)?\s*(?:of)?\s*)?(?:between|from)\s*(\d{1,3})\s*(?:-|–|—|\sto\s|and)\s*(\d{1,3})',
+    'age_simple_range': r'(\d{1,3})\s*(?:-|–|—)\s*(\d{1,3})\s*(?:years?)?',
+    'age_bound': r'(?:age\s*|applicant\s*|applicants\s*|applicant\'s\s*)?(?:(?:over|above|at least|>=)\s*(?P<age_min>\d{1,3})|(?:under|below|less than|<=|not exceeding)\s*(?P<age_max>\d{1,3}))',
+
+    'income_max': r'(?:family\'s\s+|annual\s+|annual\s+family\s+|family\s+annual\s+)?(?:income|earnings|annual income|family income|total family income)\s*(?:should be|should not exceed|should not be more than|should be less than|is|are|:)?\s*(?:less than|below|under|not exceeding)?\s*(?:₹|Rs\.?|INR)?\s*([\d,]+(?:\.\d+)?)\s*(?:lakh|lakhs|lacs|thousand|k|per annum|per year|/year|pa|p\.a\.|annum)?',
+    'income_min': r'(?:income|earnings|annual income|family income)\s*(?:should be|should exceed|must be|more than|over)\s*(?:₹|Rs\.?|INR)?\s*([\d,]+(?:\.\d+)?)',
+
+    'gender_keywords': r'\b(women|woman|female|widow|widows|men|man|male)\b',
+
+    'state_regex': r'\bresident\s+(?:of|in)?\s+([A-Z]?[a-zA-Z0-9&\-\s]+?)(?:[\.\n,;]|$)',
+
+    'not_eligible_for': r'([A-Za-z0-9\s\-\&]+?)\s+(?:are|is|were|being|be)\s+not\s+eligible|not\s+eligible\s+for\s+([A-Za-z0-9\s\-\&]+)',
+
+    'caste': r'\b(?:(?P<sc>sc|scheduled\s+caste|scheduled\s+castes)|(?P<st>st|scheduled\s+tribe|scheduled\s+tribes)|(?P<obc>obc|other\s+backward\s+class|backward\s+class)|(?P<general>general|unreserved|ur))\b'
+}
+
+# prefix-factored so the engine branches per character instead of retrying every job
+_PATTERNS['occupation_regex'] = r'\b(' + _trie_pattern(INDIAN_JOBS) + r')(?:s)?\b'
+
+# compiled once at import and shared by every parser
+_COMPILED = {k: re.compile(v, re.IGNORECASE) for k, v in _PATTERNS.items()}
+_RE_STATE_SUFFIX = re.compile(r'\s+state$', re.IGNORECASE)
+_RE_LIST_SPLIT = re.compile(r',|\band\b', re.IGNORECASE)
+_RE_DIGIT = re.compile(r'\d')
+
+
+def _build_job_automaton(jobs):
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for job in jobs:
+        automaton.add_word(job, job)
+    automaton.make_automaton()
+    return automaton
+
+
+_JOB_AUTOMATON = _build_job_automaton(INDIAN_JOBS)
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+def _find_jobs(text):
+    # same hits as occupation_regex.findall on ASCII text, from one linear automaton pass:
+    # whole words only, optional plural 's', longest job per start, no overlaps
+    low = text.lower()
+    n = len(low)
+    longest = {}
+    for end, job in _JOB_AUTOMATON.iter(low):
+        start = end - len(job) + 1
+        if start > 0 and _is_word_char(low[start - 1]):
+            continue
+        stop = end + 1
+        if stop < n and low[stop] == 's':
+            stop += 1
+        if stop < n and _is_word_char(low[stop]):
+            continue
+        if stop > longest.get(start, (0, None))[0]:
+            longest[start] = (stop, job)
+    jobs = []
+    last_stop = 0
+    for start in sorted(longest):
+        if start >= last_stop:
+            last_stop, job = longest[start]
+            jobs.append(job)
+    return jobs
+
+
 class RuleParser:
-    def __init__(self):
-        self.INDIAN_JOBS = [
-            "farmer", "engineer", "software developer", "doctor", "nurse",
-            "teacher", "professor", "student", "labourer", "shopkeeper",
-            "manager", "police", "soldier", "army", "government employee",
-            "civil servant", "artisan", "fisherman", "driver", "chef",
-            "electrician", "plumber", "carpenter", "accountant", "banker",
-            "business owner", "entrepreneur", "cleaner", "security guard",
-            "architect", "journalist", "photographer", "lawyer", "advocate",
-            "researcher", "scientist", "delivery agent", "rickshaw puller",
-            "tailor", "mechanic", "welder", "data entry operator", "clerk",
-            "home maker", "housewife", "unemployed", "retired"
-        ]
-
-        self.patterns = {
-            'age_between': r'(?:age(?:d)?\s*(?:of)?\s*)?(?:between|from)\s*(\d{1,3})\s*(?:-|–|—|\sto\s|and)\s*(\d{1,3})',
-            'age_simple_range': r'(\d{1,3})\s*(?:-|–|—)\s*(\d{1,3})\s*(?:years?)?',
-            'age_min': r'(?:age\s*|applicant\s*|applicants\s*|applicant\'s\s*)?(?:over|above|at least|>=)\s*(\d{1,3})',
-            'age_max': r'(?:age\s*|applicant\s*|applicants\s*|applicant\'s\s*)?(?:under|below|less than|<=|not exceeding)\s*(\d{1,3})',
-            
-            'income_max': r'(?:family\'s\s+|annual\s+|annual\s+family\s+|family\s+annual\s+)?(?:income|earnings|annual income|family income|total family income)\s*(?:should be|should not exceed|should not be more than|should be less than|is|are|:)?\s*(?:less than|below|under|not exceeding)?\s*(?:₹|Rs\.?|INR)?\s*([\d,]+(?:\.\d+)?)\s*(?:lakh|lakhs|lacs|thousand|k|per annum|per year|/year|pa|p\.a\.|annum)?',
-            'income_min': r'(?:income|earnings|annual income|family income)\s*(?:should be|should exceed|must be|more than|over)\s*(?:₹|Rs\.?|INR)?\s*([\d,]+(?:\.\d+)?)',
-            
-            'gender_keywords': r'\b(women|woman|female|widow|widows|men|man|male)\b',
-            
-            'state_regex': r'\bresident\s+(?:of|in)?\s+([A-Z]?[a-zA-Z0-9&\-\s]+?)(?:[\.\n,;]|$)',
-            
-            'not_eligible_for': r'([A-Za-z0-9\s\-\&]+?)\s+(?:are|is|were|being|be)\s+not\s+eligible|not\s+eligible\s+for\s+([A-Za-z0-9\s\-\&]+)',
-            
-            'caste_sc': r'\b(sc|scheduled\s+caste|scheduled\s+castes)\b',
-            'caste_st': r'\b(st|scheduled\s+tribe|scheduled\s+tribes)\b',
-            'caste_obc': r'\b(obc|other\s+backward\s+class|backward\s+class)\b',
-            'caste_general': r'\b(general|unreserved|ur)\b'
-        }
-
-        job_pattern = '|'.join(re.escape(job) for job in self.INDIAN_JOBS)
-        self.patterns['occupation_regex'] = r'\b(' + job_pattern + r')(?:s)?\b'
-
-        self.compiled_patterns = {k: re.compile(v, re.IGNORECASE) for k, v in self.patterns.items()}
+    # the patterns are module constants; these keep the old attribute names working
+    INDIAN_JOBS = INDIAN_JOBS
+    patterns = _PATTERNS
+    compiled_patterns = _COMPILED
 
     def _clean_amount(self, amt_str):
         if amt_str is None: return None
@@ -67,13 +143,16 @@ class RuleParser:
                 rules.append({"field": "age", "op": ">=", "value": int(a)})
                 rules.append({"field": "age", "op": "<=", "value": int(b)})
                 return rules
-        m = self.compiled_patterns['age_min'].search(text)
-        if m:
-            a = self._clean_amount(m.group(1))
+        # one pass for both bounds, keeping the first hit of each
+        bounds = {}
+        for m in self.compiled_patterns['age_bound'].finditer(text):
+            bounds.setdefault(m.lastgroup, m.group(m.lastgroup))
+            if len(bounds) == 2: break
+        if 'age_min' in bounds:
+            a = self._clean_amount(bounds['age_min'])
             if a is not None: rules.append({"field": "age", "op": ">=", "value": int(a)})
-        m = self.compiled_patterns['age_max'].search(text)
-        if m:
-            a = self._clean_amount(m.group(1))
+        if 'age_max' in bounds:
+            a = self._clean_amount(bounds['age_max'])
             if a is not None: rules.append({"field": "age", "op": "<=", "value": int(a)})
         return rules
 
@@ -91,16 +170,19 @@ class RuleParser:
 
     def _normalize_token(self, s: str) -> str:
         s = s.lower().strip()
-        s = re.sub(r'\s+state$', '', s, flags=re.IGNORECASE).strip()
+        # only tokens ending in "state" can carry the suffix (IGNORECASE also folds the long s)
+        if s.endswith(('state', '\u017ftate')):
+            s = _RE_STATE_SUFFIX.sub('', s).strip()
         if s.endswith('s') and len(s) > 3: s = s[:-1]
         return s
 
     def _parse_caste(self, text: str) -> List[dict]:
+        groups = {m.lastgroup for m in self.compiled_patterns['caste'].finditer(text)}
         castes_found = set()
-        if self.compiled_patterns['caste_sc'].search(text): castes_found.add("Scheduled Caste (SC)")
-        if self.compiled_patterns['caste_st'].search(text): castes_found.add("Scheduled Tribe (ST)")
-        if self.compiled_patterns['caste_obc'].search(text): castes_found.add("Other Backward Classes (OBC)")
-        if self.compiled_patterns['caste_general'].search(text): castes_found.add("General/Unreserved")
+        if 'sc' in groups: castes_found.add("Scheduled Caste (SC)")
+        if 'st' in groups: castes_found.add("Scheduled Tribe (ST)")
+        if 'obc' in groups: castes_found.add("Other Backward Classes (OBC)")
+        if 'general' in groups: castes_found.add("General/Unreserved")
         
         if castes_found:
             return [{"field": "caste", "op": "in", "value": list(castes_found)}]
@@ -113,13 +195,16 @@ class RuleParser:
         for m in self.compiled_patterns['not_eligible_for'].finditer(text):
             group = (m.group(1) or m.group(2) or "").strip()
             if not group: continue
-            parts = re.split(r',|\band\b', group, flags=re.IGNORECASE)
+            parts = _RE_LIST_SPLIT.split(group)
             for part in parts:
                 norm = self._normalize_token(part)
                 if norm: excluded.add(norm)
 
-        occs = self.compiled_patterns['occupation_regex'].findall(text)
-        occ_norms = sorted({self._normalize_token(o) for o in occs if o})
+        if _JOB_AUTOMATON is not None and text.isascii():
+            occs = _find_jobs(text)
+        else:
+            occs = self.compiled_patterns['occupation_regex'].findall(text)
+        occ_norms = sorted({_JOB_NORMS.get(o.lower()) or self._normalize_token(o) for o in occs if o})
         positive_occs = [o for o in occ_norms if o not in excluded]
         if positive_occs:
             rules.append({"field": "occupation", "op": "in", "value": positive_occs})
@@ -137,19 +222,25 @@ class RuleParser:
         loc = self.compiled_patterns['state_regex'].search(text)
         if loc:
             location = loc.group(1).strip()
-            location = re.sub(r'\s+state$', '', location, flags=re.IGNORECASE).strip()
+            location = _RE_STATE_SUFFIX.sub('', location).strip()
             rules.append({"field": "state", "op": "in", "value": [location]})
 
         return rules
 
     def parse_text(self, text: str):
-        original_text = text
-        text = text.strip()
+        return parse_text(text)
+
+    def _parse(self, text: str):
         conditions = []
         confidence = 1.0
 
-        conditions.extend(self._parse_age(text))
-        conditions.extend(self._parse_income(text))
+        # every age pattern needs a digit and every income pattern names income/earnings,
+        # so snippets without them skip those passes (ASCII only: IGNORECASE folds more than lower())
+        if _RE_DIGIT.search(text):
+            conditions.extend(self._parse_age(text))
+        low = text.lower()
+        if not text.isascii() or 'income' in low or 'earnings' in low:
+            conditions.extend(self._parse_income(text))
         conditions.extend(self._parse_categorical(text))
         conditions.extend(self._parse_caste(text)) # Add caste parsing
 
@@ -157,4 +248,16 @@ class RuleParser:
             confidence = 0.0
 
         rule_structure = {"all": conditions}
-        return rule_structure, confidence
\ No newline at end of file
+        return rule_structure, confidence
+
+
+_default_parser = RuleParser()
+# job -> normalized token, computed once; hits are looked up instead of re-normalized
+_JOB_NORMS = {job: _default_parser._normalize_token(job) for job in INDIAN_JOBS}
+_parse_cached = lru_cache(maxsize=4096)(_default_parser._parse)
+
+
+def parse_text(text: str):
+    # cached on the stripped text; callers get their own copy of the rule dicts
+    rule_structure, confidence = _parse_cached(text.strip())
+    return copy.deepcopy(rule_structure), confidence
@@ -1,14 +1,29 @@
 import os
 import sys
+import logging
 import importlib.util
+import orjson
+from sqlalchemy import insert, text
 from db import db
 from models import Scheme, SchemeRule
-from rule_parser import RuleParser
+from rule_parser import parse_text
+
+logger = logging.getLogger(__name__)
+SEED_LOCK_KEY = 7411  # arbitrary pg advisory lock key shared by every worker
 
 def load_scraped_schemes():
     current_dir = os.path.dirname(os.path.abspath(__file__))
+    json_file_path = os.path.join(current_dir, 'output', 'sample_schemes.json')
     output_file_path = os.path.join(current_dir, 'output', 'sample_schemes.py')
 
+    if os.path.exists(json_file_path):
+        try:
+            with open(json_file_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except Exception as e:
+            print(f"Error loading scraped data: {e}")
+            return []
+
     if not os.path.exists(output_file_path):
         print(f"Warning: Scraped data file not found at {output_file_path}")
         print("Please run 'runner.py' inside the webapp folder first.")
@@ -30,7 +45,11 @@ def load_scraped_schemes():
         return []
 
 def ensure_sample_data():
-    if Scheme.query.count() > 0:
+    if db.engine.dialect.name == "postgresql":
+        # workers booting together queue here; the lock is released on commit/rollback
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEED_LOCK_KEY})
+    if db.session.query(Scheme.id).limit(1).first() is not None:
+        db.session.rollback()
         return
 
     print("Starting Data seed")
@@ -38,10 +57,11 @@ def ensure_sample_data():
     
     if not raw_inputs:
         print("No data found to insert.")
+        db.session.rollback()
         return
-    parser = RuleParser()
-    
-    count = 0
+
+    scheme_rows = []
+    parsed_rules = []
     for item in raw_inputs:
         title = item.get('title', 'Unknown Scheme')
         raw_text = item.get('description', '') 
@@ -52,9 +72,9 @@ def ensure_sample_data():
             print(f"Skipping '{title}': Insufficient description text for parsing.")
             continue
 
-        print(f"Processing: {title}...")
+        logger.debug("Processing: %s...", title)
 
-        rule_json, confidence = parser.parse_text(raw_text)
+        rule_json, confidence = parse_text(raw_text)
 
         detected_state = scraped_state
         
@@ -64,25 +84,36 @@ def ensure_sample_data():
                     detected_state = rule['value'][0].title() 
                     break
 
-        scheme = Scheme(
-            title=title,
-            description=raw_text, 
-            state=detected_state, 
-            source_url=source_url
-        )
-        
-        db.session.add(scheme)
-        db.session.flush() 
-
-        scheme_rule = SchemeRule(
-            scheme_id=scheme.id,
-            rule_json=rule_json,
-            snippet=raw_text[:500],
-            parser_confidence=confidence,
-            verified=False 
-        )
-        db.session.add(scheme_rule)
-        count += 1
+        scheme_rows.append({
+            "title": title,
+            "description": raw_text,
+            "state": detected_state,
+            "source_url": source_url
+        })
+        parsed_rules.append((rule_json, raw_text[:500], confidence))
+
+    if not scheme_rows:
+        print("No data found to insert.")
+        db.session.rollback()
+        return
+
+    # batched multi-row INSERT ... RETURNING, ids come back in input order
+    scheme_ids = db.session.execute(
+        insert(Scheme).returning(Scheme.id, sort_by_parameter_order=True),
+        scheme_rows
+    ).scalars().all()
+
+    rule_rows = [
+        {
+            "scheme_id": scheme_id,
+            "rule_json": rule_json,
+            "snippet": snippet,
+            "parser_confidence": confidence,
+            "verified": False
+        }
+        for scheme_id, (rule_json, snippet, confidence) in zip(scheme_ids, parsed_rules)
+    ]
+    db.session.execute(insert(SchemeRule), rule_rows)
 
     db.session.commit()
-    print(f"--- Successfully Inserted {count} Schemes ---")
\ No newline at end of file
+    print(f"--- Successfully Inserted {len(scheme_ids)} Schemes ---")
\ No newline at end of file
@@ -0,0 +1,24 @@
+from gevent import monkey
+monkey.patch_all()
+
+from gevent.socket import wait_read, wait_write
+from psycopg2 import extensions, OperationalError
+
+
+def gevent_wait_callback(conn, timeout=None):
+    # let psycopg2 yield to other greenlets while waiting on the database
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+extensions.set_wait_callback(gevent_wait_callback)
+
+from app import app